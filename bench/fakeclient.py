@@ -0,0 +1,247 @@
+from asyncio import sleep as asleep
+from itertools import count
+from os import path as ospath
+from random import getrandbits
+from shutil import copyfile
+from time import time
+
+from aiofiles import open as aiopen
+from pyrogram import raw, utils
+from pyrogram.errors import FilePartMissing
+from pyrogram.parser import Parser
+
+class Link:
+    def __init__(self, latency=0.1, bandwidth=0):
+        self.latency = latency
+        self.bandwidth = bandwidth * 1024 * 1024
+
+    async def rpc(self):
+        await asleep(self.latency)
+
+    async def transfer(self, size, progress=None, chunk=1024 * 1024):
+        done = 0
+        while done < size:
+            step = min(chunk, size - done)
+            if self.bandwidth:
+                await asleep(step / self.bandwidth)
+            done += step
+            if progress:
+                await progress(done, size)
+
+class Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class FakeCaption(str):
+    @property
+    def html(self):
+        return str(self)
+
+class FakeMessage:
+    __ids = count(1)
+
+    def __init__(self, client, chat_id, text=None, caption=None, document=None, source=None):
+        self._client = client
+        self.id = next(self.__ids)
+        self.chat = Obj(id=chat_id, type=None)
+        self.from_user = Obj(id=1, first_name="Bench", mention="Bench")
+        self.text = text
+        self.caption = FakeCaption(caption) if caption else None
+        self.document = document
+        self.video = None
+        self.empty = False
+        self._source = source
+        self.edits = 0
+
+    async def edit_text(self, text, *args, **kwargs):
+        await self._client.link.rpc()
+        self.text = text
+        self.edits += 1
+        self._client.count("edit_text")
+        return self
+
+    edit = edit_text
+
+    async def edit_caption(self, caption, *args, **kwargs):
+        return await self.edit_text(caption)
+
+    async def edit_reply_markup(self, *args, **kwargs):
+        return await self.edit_text(self.text)
+
+    async def delete(self, *args, **kwargs):
+        await self._client.link.rpc()
+        self._client.count("delete")
+        return True
+
+    async def reply(self, text=None, *args, **kwargs):
+        return await self._client.send_message(self.chat.id, text)
+
+    async def copy(self, chat_id, *args, **kwargs):
+        await self._client.link.rpc()
+        self._client.count("copy")
+        return FakeMessage(self._client, chat_id, caption=self.caption, document=self.document)
+
+    async def pin(self, *args, **kwargs):
+        return self
+
+    async def download(self, file_name="", progress=None, *args, **kwargs):
+        await self._client.link.rpc()
+        await self._client.down.transfer(self.document.file_size, progress)
+        copyfile(self._source, file_name)
+        self._client.count("download")
+        return file_name
+
+class FakeSession:
+    def __init__(self, client, dc_id, auth_key, test_mode, is_media=False):
+        self.client = client
+
+    async def start(self):
+        await self.client.link.rpc()
+
+    async def stop(self):
+        pass
+
+    async def invoke(self, query):
+        await self.client.up.rpc()
+        await self.client.up.transfer(len(query.bytes))
+        self.client.count("save_file_part")
+        self.client.parts.setdefault(query.file_id, {})[query.file_part] = len(query.bytes)
+        return True
+
+class FakeStorage:
+    async def dc_id(self):
+        return 1
+
+    async def auth_key(self):
+        return bytes(256)
+
+    async def test_mode(self):
+        return False
+
+class FakeClient:
+    def __init__(self, latency=0.1, up_mbps=0, down_mbps=0):
+        self.link = Link(latency)
+        self.up = Link(latency, up_mbps)
+        self.down = Link(latency, down_mbps)
+        self.me = Obj(id=1, username="BenchBot", first_name="Bench")
+        self.calls = {}
+        self.messages = {}
+        self.documents = []
+        self.parts = {}
+        self.message_cache = {}
+        self.storage = FakeStorage()
+        self.parser = Parser(self)
+        self.__stopped = False
+
+    def rnd_id(self):
+        return getrandbits(63)
+
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def __store(self, msg):
+        self.messages[(msg.chat.id, msg.id)] = msg
+        return msg
+
+    def incoming(self, chat_id, path, name, unique_id):
+        size = ospath.getsize(path)
+        document = Obj(file_name=name, file_size=size, file_id=f"file-{unique_id}", file_unique_id=unique_id, mime_type="video/x-matroska")
+        return self.__store(FakeMessage(self, chat_id, document=document, source=path))
+
+    async def get_me(self):
+        await self.link.rpc()
+        self.count("get_me")
+        return self.me
+
+    async def get_chat(self, chat_id):
+        await self.link.rpc()
+        self.count("get_chat")
+        return Obj(id=chat_id, title=f"Chat {chat_id}")
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        await self.link.rpc()
+        self.count("send_message")
+        return self.__store(FakeMessage(self, chat_id, text=text))
+
+    async def send_photo(self, chat_id, photo=None, caption=None, *args, **kwargs):
+        await self.link.rpc()
+        self.count("send_photo")
+        return self.__store(FakeMessage(self, chat_id, caption=caption))
+
+    async def send_document(self, chat_id, document, thumb=None, caption=None, progress=None, *args, **kwargs):
+        self.__stopped = False
+        await self.link.rpc()
+        size = ospath.getsize(document)
+        await self.up.transfer(size, progress)
+        self.count("send_document")
+        doc = Obj(file_name=ospath.basename(document), file_size=size, file_id=f"up-{time()}", file_unique_id=f"up-{time()}", mime_type="video/x-matroska")
+        msg = self.__store(FakeMessage(self, chat_id, caption=caption, document=doc, source=document))
+        self.documents.append(msg)
+        return msg
+
+    send_video = send_document
+
+    async def save_file(self, path, *args, **kwargs):
+        await self.link.rpc()
+        self.count("save_file")
+        return raw.types.InputFile(id=self.rnd_id(), parts=1, name=ospath.basename(path), md5_checksum="")
+
+    async def resolve_peer(self, chat_id):
+        return raw.types.InputPeerChannel(channel_id=utils.get_channel_id(int(chat_id)), access_hash=0)
+
+    async def invoke(self, query):
+        await self.link.rpc()
+        self.count(type(query).__name__)
+        if not isinstance(query, raw.functions.messages.SendMedia):
+            raise NotImplementedError(type(query).__name__)
+        file, parts = query.media.file, self.parts.get(query.media.file.id, {})
+        for no in range(file.parts):
+            if no not in parts:
+                raise FilePartMissing(value=no)
+        chat_id = utils.get_channel_id(query.peer.channel_id)
+        size = sum(self.parts.pop(file.id).values())
+        doc = Obj(file_name=file.name, file_size=size, file_id=f"up-{file.id}", file_unique_id=f"up-{file.id}", mime_type=query.media.mime_type)
+        msg = self.__store(FakeMessage(self, chat_id, caption=query.message, document=doc))
+        self.documents.append(msg)
+        now = int(time())
+        return raw.types.Updates(
+            updates=[raw.types.UpdateNewChannelMessage(pts=0, pts_count=0, message=raw.types.Message(
+                id=msg.id, peer_id=raw.types.PeerChannel(channel_id=query.peer.channel_id), date=now, message=query.message, entities=query.entities or [],
+                media=raw.types.MessageMediaDocument(document=raw.types.Document(id=file.id, access_hash=0, file_reference=b"",
+                    date=now, mime_type=query.media.mime_type, size=size, dc_id=1, attributes=query.media.attributes, thumbs=[]))))],
+            users=[], chats=[raw.types.Channel(id=query.peer.channel_id, title=f"Chat {chat_id}", photo=raw.types.ChatPhotoEmpty(), date=now, access_hash=0, restriction_reason=[])],
+            date=now, seq=0)
+
+    async def send_cached_media(self, chat_id, file_id, caption=None, *args, **kwargs):
+        await self.link.rpc()
+        self.count("send_cached_media")
+        return self.__store(FakeMessage(self, chat_id, caption=caption))
+
+    async def get_messages(self, chat_id, message_ids=None, *args, **kwargs):
+        await self.link.rpc()
+        self.count("get_messages")
+        return self.messages.get((chat_id, message_ids)) or Obj(empty=True)
+
+    async def edit_message_text(self, chat_id, message_id, text, *args, **kwargs):
+        await self.link.rpc()
+        self.count("edit_text")
+
+    async def delete_messages(self, chat_id, message_ids, *args, **kwargs):
+        await self.link.rpc()
+        self.count("delete_messages")
+        return True
+
+    async def stream_media(self, message, limit=0, offset=0):
+        await self.down.rpc()
+        async with aiopen(message._source, "rb") as f:
+            await f.seek(offset * 1024 * 1024)
+            sent = 0
+            while (not limit or sent < limit) and (chunk := await f.read(1024 * 1024)):
+                if self.down.bandwidth:
+                    await asleep(len(chunk) / self.down.bandwidth)
+                sent += 1
+                yield chunk
+        self.count("stream_media")
+
+    def stop_transmission(self):
+        self.__stopped = True
@@ -0,0 +1,158 @@
+from argparse import ArgumentParser
+from functools import wraps
+from json import dumps
+from os import environ, path as ospath, makedirs, times as os_times, cpu_count
+from subprocess import run as srun
+from sys import modules
+from time import time
+
+for key, val in {"API_ID": "1", "API_HASH": "bench", "BOT_TOKEN": "1:bench", "MONGO_URI": "mongodb://127.0.0.1:1",
+                 "MAIN_CHANNEL": "-1001000000001", "FILE_STORE": "-1001000000002", "LOG_CHANNEL": "0", "THUMB": "", "BACKUP_CHANNEL": ""}.items():
+    environ.setdefault(key, val)
+
+import psutil
+
+from bench.fakeclient import FakeClient, FakeSession
+
+SRT = "1\n00:00:00,000 --> 00:00:05,000\nBenchmark Episode\n"
+
+class FakeDB:
+    def __init__(self):
+        self.jobs = {}
+
+    async def finishJob(self, job_id, state="posted", ttl=604800):
+        self.jobs[job_id] = state
+
+    def __getattr__(self, name):
+        async def noop(*args, **kwargs):
+            return None
+        return noop
+
+def swap(old, new):
+    for module in list(modules.values()):
+        if not getattr(module, "__name__", "").startswith("bot"):
+            continue
+        for attr, val in list(vars(module).items()):
+            if val is old:
+                setattr(module, attr, new)
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, took):
+        self.stages.setdefault(stage, []).append(took)
+
+    def wrap(self, owner, name, stage):
+        func = getattr(owner, name)
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.add(stage, time() - start)
+        setattr(owner, name, wrapper)
+
+    def report(self):
+        return {stage: {"count": len(vals), "total": round(sum(vals), 3), "avg": round(sum(vals) / len(vals), 3), "max": round(max(vals), 3)}
+                for stage, vals in self.stages.items()}
+
+def gen_episode(path, duration, size):
+    makedirs(ospath.dirname(path), exist_ok=True)
+    if ospath.exists(path):
+        return path
+    srt = f"{path}.srt"
+    with open(srt, "w") as f:
+        f.write(SRT)
+    srun(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=24000/1001",
+          "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000", "-i", srt, "-t", str(duration),
+          "-map", "0:v", "-map", "1:a", "-map", "2:s", "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+          "-c:a", "aac", "-c:s", "srt", path], check=True)
+    return path
+
+async def run(args):
+    from bot import Var
+    import bot as botpkg
+    from bot.core import database, auto_animes, filehandler, ffencoder, tguploader, text_utils
+    from bot.core.workers import ffpool
+
+    client = FakeClient(args.latency, args.up_mbps, args.down_mbps)
+    swap(botpkg.bot, client)
+    fake_db = FakeDB()
+    swap(database.db, fake_db)
+    tguploader.Session = FakeSession
+    if args.quals:
+        Var.QUALS[:] = args.quals.split()
+    Var.MULTI_ENCODE = args.multi
+    if not args.anilist:
+        async def no_anilist(self):
+            return {}
+        text_utils.AniLister.get_anidata = no_anilist
+
+    timer = StageTimer()
+    timer.wrap(text_utils.TextEditor, "load_anilist", "anilist")
+    timer.wrap(filehandler.FileHandler, "save_file", "download")
+    timer.wrap(ffencoder.FFEncoder, "start_encode", "encode")
+    timer.wrap(ffencoder.FFMultiEncoder, "start_encode", "encode")
+    timer.wrap(tguploader.TgUploader, "upload", "upload")
+    timer.wrap(client, "send_photo", "post")
+    process_file = auto_animes.process_file
+
+    source = gen_episode(ospath.join("downloads", "bench", f"source_{args.duration}s_{args.size}.mkv"), args.duration, args.size)
+    msgs = [client.incoming(int(Var.ADMINS[0]), source, f"[Bench] Synthetic Episode - {no:02d} [1080p].mkv", f"bench-{no}")
+            for no in range(1, args.episodes + 1)]
+
+    from asyncio import Semaphore, gather
+    sem = Semaphore(args.concurrency)
+    async def feed(msg):
+        async with sem:
+            start = time()
+            await process_file(msg)
+            timer.add("episode", time() - start)
+
+    psutil.cpu_percent(interval=None)
+    cpu_start, start = os_times(), time()
+    await gather(*(feed(msg) for msg in msgs))
+    wall, cpu_end = time() - start, os_times()
+    cpu_secs = (cpu_end.user + cpu_end.system + cpu_end.children_user + cpu_end.children_system) - \
+               (cpu_start.user + cpu_start.system + cpu_start.children_user + cpu_start.children_system)
+    done = sum(1 for state in fake_db.jobs.values() if state == "posted")
+    return {
+        "config": {"episodes": args.episodes, "concurrency": args.concurrency, "duration": args.duration, "size": args.size,
+                   "quals": Var.QUALS, "multi_encode": Var.MULTI_ENCODE, "encode_workers": ffpool.workers,
+                   "latency": args.latency, "up_mbps": args.up_mbps, "down_mbps": args.down_mbps},
+        "wall": round(wall, 3),
+        "completed": done,
+        "failed": args.episodes - done,
+        "stages": timer.report(),
+        "queue_wait": {"avg": round(ffpool.avg_wait, 3)},
+        "cpu": {"seconds": round(cpu_secs, 3), "utilization": round(cpu_secs / max(wall * (cpu_count() or 1), 1e-9), 4),
+                "system_percent": psutil.cpu_percent(interval=None)},
+        "episodes_per_hour": round(done / wall * 3600, 2) if wall else 0.0,
+        "api_calls": client.calls,
+    }
+
+def main():
+    parser = ArgumentParser(description="End-to-End Pipeline Benchmark against a Fake Telegram Client")
+    parser.add_argument("--episodes", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--duration", type=int, default=30, help="Synthetic Episode Length in Seconds")
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--quals", default="", help="Override QUALS, e.g. '480 720'")
+    parser.add_argument("--multi", action="store_true", help="Use Single-Decode Multi Encode")
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake API Round Trip in Seconds")
+    parser.add_argument("--up-mbps", type=float, default=20.0)
+    parser.add_argument("--down-mbps", type=float, default=40.0)
+    parser.add_argument("--anilist", action="store_true", help="Query Live AniList Instead of Skipping")
+    parser.add_argument("--out", default="bench_report.json")
+    args = parser.parse_args()
+
+    from bot import bot_loop
+    report = bot_loop.run_until_complete(run(args))
+    with open(args.out, "w") as f:
+        f.write(dumps(report, indent=2))
+    print(dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
-from os import path as ospath, mkdir, system, getenv
+from os import path as ospath, mkdir, system, getenv, cpu_count
 from logging import INFO, ERROR, FileHandler, StreamHandler, basicConfig, getLogger
 from traceback import format_exc
-from asyncio import Queue, Lock
 import asyncio
 
 from pyrogram import filters, Client
@@ -30,9 +29,6 @@ ani_cache = {
     'completed': set()
 }
 ffpids_cache = list()
-ffLock = Lock()
-ffQueue = Queue()
-ff_queued = dict()
 
 class Var:
     API_ID = getenv("API_ID")
@@ -46,14 +42,26 @@ class Var:
 
     RSS_ITEMS = getenv("RSS_ITEMS", "https://subsplease.org/rss/?r=1080").split()
     FSUB_CHATS = list(map(int, getenv("FSUB_CHATS", "0").split()))
+    FSUB_TTL = int(getenv("FSUB_TTL", "300"))
+    FSUB_WORKERS = int(getenv("FSUB_WORKERS", "8"))
+    FSUB_META_TTL = int(getenv("FSUB_META_TTL", "21600"))
     BACKUP_CHANNEL = getenv("BACKUP_CHANNEL") or ""
     MAIN_CHANNEL = int(getenv("MAIN_CHANNEL", "0"))
     LOG_CHANNEL = int(getenv("LOG_CHANNEL", "0"))
     FILE_STORE = int(getenv("FILE_STORE", "0"))
     ADMINS = list(map(int, getenv("ADMINS", "1242011540").split()))
     PORT = getenv("PORT", "8080") 
+    PEER_WORKERS = int(getenv("PEER_WORKERS", "4"))
+    PEER_TTL = int(getenv("PEER_TTL", "604800"))
 
     SEND_SCHEDULE = getenv("SEND_SCHEDULE", "False").lower() == "true"
+    ANI_CACHE_TTL = int(getenv("ANI_CACHE_TTL", "604800"))
+    ANI_NEG_TTL = int(getenv("ANI_NEG_TTL", "86400"))
+    HTTP_POOL_LIMIT = int(getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_HOST_LIMIT = int(getenv("HTTP_HOST_LIMIT", "8"))
+    HTTP_TIMEOUT = int(getenv("HTTP_TIMEOUT", "30"))
+    HTTP_RETRIES = int(getenv("HTTP_RETRIES", "3"))
+    IO_WORKERS = int(getenv("IO_WORKERS", "0"))
     BRAND_UNAME = getenv("BRAND_UNAME", "@username")
 
     FFCODE_1080 = getenv("FFCODE_1080") or """ffmpeg -i '{}' -progress '{}' -preset veryfast -c:v libx264 -s 1920x1080 -pix_fmt yuv420p -crf 30 -c:a libopus -b:a 32k -c:s copy -map 0 -ac 2 -ab 32k -vb[...]"""
@@ -61,11 +69,36 @@ class Var:
     FFCODE_480 = getenv("FFCODE_480") or """ffmpeg -i '{}' -progress '{}' -preset superfast -c:v libx264 -s 854x480 -pix_fmt yuv420p -crf 30 -c:a libopus -b:a 32k -c:s copy -map 0 -ac 2 -ab 32k -vbr 2[...]"""
     FFCODE_360 = getenv("FFCODE_360") or """ffmpeg -i '{}' -progress '{}' -preset superfast -c:v libx264 -s 640x360 -pix_fmt yuv420p -crf 30 -c:a libopus -b:a 32k -c:s copy -map 0 -ac 2 -ab 32k -vbr 2[...]"""
     QUALS = getenv("QUALS", "480 720 1080").split()
+    ENCODE_PROFILE = getenv("ENCODE_PROFILE", "default")
+    TUNE_PRESETS = getenv("TUNE_PRESETS", "superfast veryfast faster")
+    TUNE_CRFS = getenv("TUNE_CRFS", "24 27 30")
+    TUNE_CLIP_SECS = int(getenv("TUNE_CLIP_SECS", "10"))
+    TUNE_MIN_SSIM = float(getenv("TUNE_MIN_SSIM", "0.97"))
+    TUNE_MAX_KBPS = getenv("TUNE_MAX_KBPS", "1080:2500 720:1400 480:800 360:500")
+    MULTI_ENCODE = getenv("MULTI_ENCODE", "False").lower() == "true"
+    ENCODE_WORKERS = int(getenv("ENCODE_WORKERS") or "0") or max(1, (cpu_count() or 1) // 4)
+    REMUX = getenv("REMUX", "True").lower() == "true"
+    CHUNK_ENCODE = getenv("CHUNK_ENCODE", "False").lower() == "true"
+    CHUNK_COUNT = int(getenv("CHUNK_COUNT", "0"))
+    CHUNK_MIN_SECS = int(getenv("CHUNK_MIN_SECS", "60"))
+
+    EDIT_CHAT_RATE = float(getenv("EDIT_CHAT_RATE", "0.33"))
+    EDIT_GLOBAL_RATE = float(getenv("EDIT_GLOBAL_RATE", "20"))
+    SEND_USER_RATE = float(getenv("SEND_USER_RATE", "0.5"))
+    SEND_GLOBAL_RATE = float(getenv("SEND_GLOBAL_RATE", "25"))
+    FILE_CACHE_SIZE = int(getenv("FILE_CACHE_SIZE", "1024"))
+
+    DL_WORKERS = int(getenv("DL_WORKERS", "4"))
+    DL_PART_MB = int(getenv("DL_PART_MB", "16"))
+    STREAM_INGEST = getenv("STREAM_INGEST", "False").lower() == "true"
+    UL_WORKERS = int(getenv("UL_WORKERS", "4"))
+    DEDUPE_HASH = getenv("DEDUPE_HASH", "True").lower() == "true"
 
     AS_DOC = getenv("AS_DOC", "True").lower() == "true"
     THUMB = getenv("THUMB", "https://te.legra.ph/file/621c8d40f9788a1db7753.jpg")
     AUTO_DEL = getenv("AUTO_DEL", "True").lower() == "true"
     DEL_TIMER = int(getenv("DEL_TIMER", "600"))
+    AUTO_DEL_TICK = int(getenv("AUTO_DEL_TICK", "10"))
     START_PHOTO = getenv("START_PHOTO", "https://te.legra.ph/file/120de4dbad87fb20ab862.jpg")
     START_MSG = getenv("START_MSG", "<b>Hey {first_name}</b>,\n\n<i>I am Auto Animes Store & Automater Encoder Build with ❤️ !!</i>")
     START_BUTTONS = getenv("START_BUTTONS", "UPDATES|https://telegram.me/Matiz_Tech SUPPORT|https://t.me/+p78fp4UzfNwzYzQ5")
@@ -91,7 +124,8 @@ try:
         api_hash=Var.API_HASH,
         bot_token=Var.BOT_TOKEN,
         plugins=dict(root="bot/modules"),
-        parse_mode=ParseMode.HTML
+        parse_mode=ParseMode.HTML,
+        max_concurrent_transmissions=max(Var.DL_WORKERS * 2, 2)
     )
     sch = AsyncIOScheduler(timezone="Asia/Kolkata", event_loop=bot_loop)
     LOGS.info("🚀 Bot and Scheduler Initialized Successfully!")
@@ -1,18 +1,28 @@
-from os import path as ospath, execl, kill
+from os import path as ospath, execl
 from sys import executable
-from signal import SIGKILL
 from aiohttp import web
-from asyncio import create_task, create_subprocess_exec, create_subprocess_shell, run as asyrun, all_tasks, gather, sleep as asleep
+from json import loads, dumps
+from time import time
+from asyncio import create_task, create_subprocess_exec, create_subprocess_shell, run as asyrun, all_tasks, gather, sleep as asleep, Semaphore
 from aiofiles import open as aiopen
 from pyrogram import idle
 from pyrogram.filters import command, user
-from pyrogram.errors import ChatIdInvalid, ChannelInvalid
+from pyrogram.errors import ChatIdInvalid, ChannelInvalid, FloodWait
+from pyrogram.raw.types import InputPeerChannel, InputPeerChat
 
-from bot import bot, Var, bot_loop, sch, LOGS, ffQueue, ffLock, ffpids_cache, ff_queued
-from bot.core.auto_animes import fetch_animes
-from bot.core.func_utils import clean_up, new_task, editMessage
+from bot import bot, Var, bot_loop, sch, LOGS
+from bot.core.auto_animes import fetch_animes, resume_jobs
+from bot.core.func_utils import clean_up, kill_ffpids, new_task, editMessage, refresh_chat_meta
+from bot.core.workers import ffpool
+from bot.core.autodel import autodel
+from bot.core.reporter import rep
+from bot.core.httpclient import http_client
+from bot.core.executors import executors
+from bot.core.autotune import load_profile
 from bot.modules.up_posts import upcoming_animes
 
+PEER_CACHE = "peers.json"
+
 # Health check endpoint for Render
 async def health_check(request):
     return web.Response(text="Bot is running!")
@@ -44,17 +54,50 @@ async def preload_chats():
             except:
                 continue
     if Var.FSUB_CHATS:
-        chat_ids.extend(Var.FSUB_CHATS)
-    LOGS.info(f"🔄 Preloading {len(chat_ids)} chat(s) for peer cache...")
-    for cid in chat_ids:
+        chat_ids.extend(cid for cid in Var.FSUB_CHATS if cid)
+    chat_ids = list(dict.fromkeys(map(int, chat_ids)))
+    cache = {}
+    if ospath.isfile(PEER_CACHE):
         try:
-            await bot.get_chat(int(cid))
-            LOGS.info(f"✅ Cached chat: {cid}")
-        except (ChatIdInvalid, ChannelInvalid):
-            LOGS.error(f"❌ Invalid or inaccessible chat: {cid}")
+            async with aiopen(PEER_CACHE) as f:
+                cache = loads(await f.read())
         except Exception as e:
-            LOGS.error(f"⚠️ Failed to preload {cid}: {e}")
-        await asleep(1)
+            LOGS.warning(f"Peer Cache Corrupted, Rebuilding : {e}")
+    now = time()
+    fresh = {cid: cache[str(cid)] for cid in chat_ids if str(cid) in cache and now - cache[str(cid)]['at'] < Var.PEER_TTL}
+    if fresh:
+        await bot.storage.update_peers([tuple(ent['peer']) for ent in fresh.values()])
+    todo = [cid for cid in chat_ids if cid not in fresh]
+    LOGS.info(f"🔄 Preloading {len(todo)} chat(s) for peer cache, {len(fresh)} loaded from {PEER_CACHE}...")
+    sem, paused = Semaphore(max(Var.PEER_WORKERS, 1)), [0]
+
+    async def resolve(cid):
+        async with sem:
+            for _ in range(3):
+                await asleep(max(paused[0] - time(), 0))
+                try:
+                    await bot.get_chat(cid)
+                    peer = await bot.resolve_peer(cid)
+                    kind = "channel" if isinstance(peer, InputPeerChannel) else "group" if isinstance(peer, InputPeerChat) else "user"
+                    fresh[cid] = {'peer': [cid, getattr(peer, "access_hash", 0), kind, None, None], 'at': time()}
+                    LOGS.info(f"✅ Cached chat: {cid}")
+                    return
+                except FloodWait as f:
+                    LOGS.warning(f"⏳ FloodWait of {f.value}s while Preloading {cid}")
+                    paused[0] = max(paused[0], time() + f.value * 1.2)
+                except (ChatIdInvalid, ChannelInvalid):
+                    LOGS.error(f"❌ Invalid or inaccessible chat: {cid}")
+                    return
+                except Exception as e:
+                    LOGS.error(f"⚠️ Failed to preload {cid}: {e}")
+                    return
+
+    await gather(*(resolve(cid) for cid in todo))
+    try:
+        async with aiopen(PEER_CACHE, "w") as f:
+            await f.write(dumps({str(cid): ent for cid, ent in fresh.items()}))
+    except Exception as e:
+        LOGS.error(f"Saving Peer Cache Failed : {e}")
 
 @bot.on_message(command('restart') & user(Var.ADMINS))
 @new_task
@@ -62,18 +105,10 @@ async def restart_bot(client, message):
     rmessage = await message.reply('<i>Restarting...</i>')
     if sch.running:
         sch.shutdown(wait=False)
-    await clean_up()
-    if len(ffpids_cache) != 0:
-        for pid in ffpids_cache:
-            try:
-                LOGS.info(f"Process ID : {pid}")
-                kill(pid, SIGKILL)
-            except (OSError, ProcessLookupError):
-                LOGS.error("Killing Process Failed !!")
-                continue
     await (await create_subprocess_exec('python3', 'update.py')).wait()
     async with aiopen(".restartmsg", "w") as f:
         await f.write(f"{rmessage.chat.id}\n{rmessage.id}\n")
+    kill_ffpids()
     execl(executable, executable, "-m", "bot")
 
 async def restart():
@@ -85,34 +120,33 @@ async def restart():
         except Exception as e:
             LOGS.error(e)
 
-async def queue_loop():
-    LOGS.info("Queue Loop Started !!")
-    while True:
-        if not ffQueue.empty():
-            post_id = await ffQueue.get()
-            await asleep(1.5)
-            ff_queued[post_id].set()
-            await asleep(1.5)
-            async with ffLock:
-                ffQueue.task_done()
-        await asleep(10)
-
 async def main():
     sch.add_job(upcoming_animes, "cron", hour=0, minute=30)
+    sch.add_job(refresh_chat_meta, "interval", seconds=Var.FSUB_META_TTL)
+    await http_client.start()
     await bot.start()
+    await load_profile()
     await preload_chats()
+    bot_loop.create_task(refresh_chat_meta(False))
     await restart()
     LOGS.info('Auto Anime Bot Started!')
     sch.start()
     
     # Start health check server
     bot_loop.create_task(start_health_server())
-    bot_loop.create_task(queue_loop())
+    ffpool.start()
+    autodel.start()
+    bot_loop.create_task(resume_jobs())
     
     await fetch_animes()
     await idle()
     LOGS.info('Auto Anime Bot Stopped!')
+    await rep.flush()
     await bot.stop()
+    ffpool.stop()
+    autodel.stop()
+    await http_client.close()
+    executors.shutdown()
     for task in all_tasks():
         task.cancel()
     await clean_up()
@@ -1,27 +1,32 @@
-from asyncio import gather, create_task, sleep as asleep, Event
+from asyncio import gather, create_task, sleep as asleep, Queue, Event
 from asyncio.subprocess import PIPE
 from os import path as ospath
 from aiofiles import open as aiopen
-from aiofiles.os import remove as aioremove
+from aiofiles.os import remove as aioremove, path as aiopath
 from traceback import format_exc
 from base64 import urlsafe_b64encode
 from time import time
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from bot import bot, bot_loop, Var, ani_cache, ffQueue, ffLock, ff_queued
+from bot import bot, bot_loop, Var, ani_cache
 from .filehandler import FileHandler
 from .database import db
-from .func_utils import encode, editMessage, sendMessage, convertBytes
+from .func_utils import encode, sendMessage, convertBytes, sync_to_async, partial_hash
+from .mediaprobe import probe_media, trim_ladder
 from .text_utils import TextEditor
-from .ffencoder import FFEncoder
+from .ffencoder import FFEncoder, FFMultiEncoder, can_remux
 from .tguploader import TgUploader
 from .reporter import rep
+from .workers import ffpool
+from .tgupdater import updater
 
 btn_formatter = {
     '1080':'1080p',
     '720':'720p',
-    '480':'480p'
+    '480':'480p',
+    '360':'360p'
 }
+ff_inflight = dict()
 
 async def fetch_animes():
     await rep.report("Bot is ready to process direct file uploads!", "info")
@@ -32,72 +37,249 @@ async def get_animes(name, force=False):
     await rep.report("Using direct file processing instead of anime fetching", "info")
     return None
 
-async def process_file(message, name=None):
+async def post_buttons(post_msg, uploaded, caption=None):
+    if not post_msg:
+        return
+    btns, uname = [], bot.me.username
+    for qual in Var.QUALS:
+        if qual not in uploaded:
+            continue
+        msg_id, size = uploaded[qual]
+        link = f"https://telegram.me/{uname}?start={await encode('get-'+str(msg_id * abs(Var.FILE_STORE)))}"
+        btn = InlineKeyboardButton(f"{btn_formatter[qual]} - {convertBytes(size)}", url=link)
+        if len(btns) != 0 and len(btns[-1]) == 1:
+            btns[-1].insert(1, btn)
+        else:
+            btns.append([btn])
+    updater.update(post_msg, caption or (post_msg.caption.html if post_msg.caption else ""), InlineKeyboardMarkup(btns) if btns else None)
+
+def stored_quals(doc):
+    return {qual: (info['msg_id'], info.get('size', 0)) for qual, info in ((doc or {}).get('quals') or {}).items() if qual in Var.QUALS}
+
+async def fail_job(job_id, *paths):
+    job = await db.getJob(job_id)
+    paths = {*paths, job.get('dl_path'), *(info.get('encoded') for info in (job.get('quals') or {}).values())}
+    for path in filter(None, paths):
+        for fpath in (path, f"{path}.parts", f"{path}.upload"):
+            if await aiopath.exists(fpath):
+                await aioremove(fpath)
+    await db.finishJob(job_id, "failed")
+
+async def resume_jobs():
+    for job in await db.getPendingJobs():
+        if job.get('attempts', 0) >= 3:
+            await fail_job(job['_id'])
+            continue
+        try:
+            message = await bot.get_messages(job['chat_id'], message_ids=job['msg_id'])
+        except Exception:
+            message = None
+        if not message or message.empty or not message.document:
+            await rep.report(f"Source of {job.get('name')} is Gone, Dropping Job...", "warning")
+            await fail_job(job['_id'])
+            continue
+        await db.saveJob(job['_id'], attempts=job.get('attempts', 0) + 1)
+        await rep.report(f"Resuming {job.get('name')} from Stage '{job.get('state')}'...", "info")
+        bot_loop.create_task(process_file(message, job.get('name'), job))
+
+async def process_file(message, name=None, job=None):
+    job_id, ffEvent = None, None
     try:
         if not name and message.document:
             name = message.document.file_name
+        uid = message.document.file_unique_id if message.document else None
+        if uid and uid in ff_inflight:
+            await rep.report(f"{name} is Already Processing, Joining Existing Task...", "info")
+        while uid and uid in ff_inflight:
+            await ff_inflight[uid].wait()
+        if uid:
+            ff_inflight[uid] = ffEvent = Event()
+        job_id = uid or f"{message.chat.id}:{message.id}"
+        if job is None:
+            job = {}
+            await db.saveJob(job_id, chat_id=message.chat.id, msg_id=message.id, name=name, state="queued",
+                             attempts=0, quals={}, dl_path=None, post_id=None, stat_id=None, expire_at=None)
         aniInfo = TextEditor(name)
         await aniInfo.load_anilist()
-        post_msg = await bot.send_photo(
-            Var.MAIN_CHANNEL,
-            photo=await aniInfo.get_poster(),
-            caption=await aniInfo.get_caption()
-        )
-        await asleep(1.5)
-        stat_msg = await sendMessage(Var.MAIN_CHANNEL, f"‣ <b>File Name :</b> <b><i>{name}</i></b>\n\n<i>Downloading...</i>")
-        file_handler = FileHandler("./downloads")
-        dl = await file_handler.save_file(message, name)
-        if not dl or not ospath.exists(dl):
-            await rep.report(f"File Download Failed", "error")
+        doc = await db.getFile(uid) if uid else {}
+        uploaded, skipped = stored_quals(doc), (doc or {}).get('skip') or []
+        post_msg = None
+        if post_id := job.get('post_id'):
+            post_msg = await bot.get_messages(Var.MAIN_CHANNEL, message_ids=post_id)
+            post_msg = None if not post_msg or post_msg.empty else post_msg
+        if not post_msg:
+            post_msg = await bot.send_photo(
+                Var.MAIN_CHANNEL,
+                photo=await aniInfo.get_poster(),
+                caption=await aniInfo.get_caption()
+            )
+            await db.saveJob(job_id, post_id=post_msg.id)
+        if all(qual in uploaded or qual in skipped for qual in Var.QUALS):
+            await rep.report(f"{name} was Already Processed, Reusing Stored Files...", "info")
+            await post_buttons(post_msg, uploaded)
+            return await db.finishJob(job_id)
+        await encode_file(message, name, uid, aniInfo, post_msg, uploaded, job_id, job)
+    except Exception as error:
+        await rep.report(format_exc(), "error")
+        if job_id:
+            await fail_job(job_id)
+    finally:
+        if ffEvent:
+            if ff_inflight.get(uid) is ffEvent:
+                del ff_inflight[uid]
+            ffEvent.set()
+
+async def encode_file(message, name, uid, aniInfo, post_msg, uploaded, job_id, job):
+    if uploaded:
+        await post_buttons(post_msg, uploaded)
+    stat_msg, stat_txt = None, f"‣ <b>File Name :</b> <b><i>{name}</i></b>\n\n<i>Downloading...</i>"
+    if stat_id := job.get('stat_id'):
+        stat_msg = await bot.get_messages(Var.MAIN_CHANNEL, message_ids=stat_id)
+        stat_msg = None if not stat_msg or stat_msg.empty else stat_msg
+        updater.update(stat_msg, stat_txt)
+    if not stat_msg:
+        stat_msg = await sendMessage(Var.MAIN_CHANNEL, stat_txt)
+        await db.saveJob(job_id, stat_id=stat_msg.id)
+    file_handler = FileHandler("./downloads")
+    stream = None
+    if job.get('state') != "queued" and (dl := job.get('dl_path')) and ospath.exists(dl):
+        await rep.report(f"Reusing Downloaded Source of {name}...", "info")
+    elif Var.STREAM_INGEST and await file_handler.streamable(message):
+        await rep.report("Streaming Source into Encoder while Downloading...", "info")
+        stream = file_handler.stream_file(message, name)
+        dl = stream.path
+    else:
+        dl = await file_handler.save_file(message, name, stat_msg)
+        if dl and ospath.exists(dl):
+            await db.saveJob(job_id, state="downloaded", dl_path=dl)
+    if not dl or not (stream or ospath.exists(dl)):
+        await rep.report(f"File Download Failed", "error")
+        await fail_job(job_id, dl or ospath.join("./downloads", name or message.document.file_name or "video_file"))
+        updater.discard(stat_msg)
+        await stat_msg.delete()
+        return
+    if stream:
+        await stream.wait(4 * 1024 * 1024)
+    aniInfo.probe = await probe_media(dl)
+    skipped = [qual for qual in Var.QUALS if qual not in trim_ladder(aniInfo.probe, Var.QUALS)]
+    if skipped:
+        await rep.report(f"Source is {aniInfo.probe.width}x{aniInfo.probe.height}, Skipping Upscaled {', '.join(skipped)}p...", "info")
+        if uid:
+            await db.saveFileSkip(uid, skipped)
+    caption = None
+    if post_msg and (aniInfo.probe.audio_langs or aniInfo.probe.sub_langs):
+        caption = await aniInfo.get_caption()
+        await post_buttons(post_msg, uploaded, caption)
+    fhash = None
+    if uid and Var.DEDUPE_HASH and not stream:
+        fhash = await sync_to_async(partial_hash, dl)
+        if (doc := await db.getFileByHash(fhash)) and doc.get('_id') != uid:
+            for qual, (msg_id, size) in stored_quals(doc).items():
+                if qual not in uploaded:
+                    uploaded[qual] = (msg_id, size)
+                    await db.saveFileQual(uid, qual, msg_id, size, fhash)
+        if all(qual in uploaded or qual in skipped for qual in Var.QUALS):
+            await rep.report(f"{name} Matches an Already Processed File, Reusing Stored Files...", "info")
+            await post_buttons(post_msg, uploaded, caption)
+            await db.finishJob(job_id)
+            updater.discard(stat_msg)
             await stat_msg.delete()
+            await aioremove(dl)
             return
-        post_id = post_msg.id
-        ffEvent = Event()
-        ff_queued[post_id] = ffEvent
-        if ffLock.locked():
-            await editMessage(stat_msg, f"‣ <b>File Name :</b> <b><i>{name}</i></b>\n\n<i>Queued to Encode...</i>")
-            await rep.report("Added Task to Queue...", "info")
-        await ffQueue.put(post_id)
-        await ffEvent.wait()
-        await ffLock.acquire()
-        btns = []
-        for qual in Var.QUALS:
-            filename = await aniInfo.get_upname(qual)
-            await editMessage(stat_msg, f"‣ <b>File Name :</b> <b><i>{filename}</i></b>\n\n<i>Ready to Encode...</i>")
-            await asleep(1.5)
-            await rep.report("Starting Encode...", "info")
-            try:
-                out_path = await FFEncoder(stat_msg, dl, filename, qual).start_encode()
-            except Exception as e:
-                await rep.report(f"Error: {e}, Cancelled, Retry Again!", "error")
-                await stat_msg.delete()
-                ffLock.release()
-                return
+    encoded = {qual: info['encoded'] for qual, info in (job.get('quals') or {}).items()
+               if qual in Var.QUALS and qual not in uploaded and info.get('encoded') and ospath.exists(info['encoded'])}
+    todo = [qual for qual in Var.QUALS if qual not in uploaded and qual not in encoded and qual not in skipped]
+    if ffpool.busy:
+        updater.update(stat_msg, f"‣ <b>File Name :</b> <b><i>{name}</i></b>\n\n<i>Queued to Encode...</i>")
+        await rep.report("Added Task to Queue...", "info")
+    upQueue = Queue()
+    async def uploader():
+        nonlocal fhash
+        while (item := await upQueue.get()) is not None:
+            qual, out_path, filename = item
             await rep.report("Successfully Compressed Now Going To Upload...", "info")
-            await editMessage(stat_msg, f"‣ <b>File Name :</b> <b><i>{filename}</i></b>\n\n<i>Ready to Upload...</i>")
-            await asleep(1.5)
-            try:
-                msg = await TgUploader(stat_msg).upload(out_path, qual)
-            except Exception as e:
-                await rep.report(f"Error: {e}, Cancelled, Retry Again!", "error")
-                await stat_msg.delete()
-                ffLock.release()
-                return
+            updater.update(stat_msg, f"‣ <b>File Name :</b> <b><i>{filename}</i></b>\n\n<i>Ready to Upload...</i>")
+            msg = await TgUploader(stat_msg).upload(out_path, qual)
             await rep.report("Successfully Uploaded File to Telegram...", "info")
-            msg_id = msg.id
-            link = f"https://telegram.me/{(await bot.get_me()).username}?start={await encode('get-'+str(msg_id * abs(Var.FILE_STORE)))}"
-            if post_msg:
-                if len(btns) != 0 and len(btns[-1]) == 1:
-                    btns[-1].insert(1, InlineKeyboardButton(f"{btn_formatter[qual]} - {convertBytes(msg.document.file_size)}", url=link))
-                else:
-                    btns.append([InlineKeyboardButton(f"{btn_formatter[qual]} - {convertBytes(msg.document.file_size)}", url=link)])
-                await editMessage(post_msg, post_msg.caption.html if post_msg.caption else "", InlineKeyboardMarkup(btns))
-            bot_loop.create_task(extra_utils(msg_id, out_path))
-        ffLock.release()
+            uploaded[qual] = (msg.id, msg.document.file_size)
+            await db.saveJobQual(job_id, qual, uploaded=msg.id, size=msg.document.file_size)
+            if uid:
+                if stream and Var.DEDUPE_HASH and not fhash:
+                    await stream.task
+                    fhash = await sync_to_async(partial_hash, dl)
+                await db.saveFileQual(uid, qual, msg.id, msg.document.file_size, fhash)
+            if ani_id := aniInfo.adata.get('id'):
+                await db.saveAnime(ani_id, str(aniInfo.pdata.get('episode_number') or name), qual, post_msg.id if post_msg else None)
+            await post_buttons(post_msg, uploaded, caption)
+            bot_loop.create_task(extra_utils(msg.id, out_path))
+
+    remux = [qual for qual in todo if not stream and can_remux(aniInfo.probe, qual)]
+    encoders = []
+    async def encode_qual(qual):
+        filename = await aniInfo.get_upname(qual)
+        encoder = FFEncoder(stat_msg, dl, filename, qual, stream)
+        encoders.append(encoder)
+        if qual in remux:
+            await rep.report(f"Source Matches {qual}p, Remuxing without Re-Encode...", "info")
+            out_path = await encoder.start_encode()
+        else:
+            await rep.report(f"Starting Encode of {qual}p...", "info")
+            out_path = await ffpool.submit(encoder.start_encode)
+        if not out_path:
+            raise Exception(f"Encode of {qual}p Failed")
+        await db.saveJobQual(job_id, qual, encoded=out_path)
+        await upQueue.put((qual, out_path, filename))
+
+    async def encode_multi(quals):
+        names = {qual: await aniInfo.get_upname(qual) for qual in quals}
+        await rep.report("Starting Multi Encode...", "info")
+        encoder = FFMultiEncoder(stat_msg, dl, names, stream)
+        encoders.append(encoder)
+        out_paths = await ffpool.submit(encoder.start_encode)
+        if not out_paths:
+            raise Exception("Multi Encode Failed")
+        for qual in quals:
+            await db.saveJobQual(job_id, qual, encoded=out_paths[qual])
+            await upQueue.put((qual, out_paths[qual], names[qual]))
+
+    async def encoder():
+        try:
+            for qual, out_path in encoded.items():
+                await upQueue.put((qual, out_path, ospath.basename(out_path)))
+            await db.saveJob(job_id, state="encoding")
+            multi = [qual for qual in todo if qual not in remux]
+            if Var.MULTI_ENCODE and len(multi) > 1:
+                await gather(encode_multi(multi), *(encode_qual(qual) for qual in remux))
+            else:
+                await gather(*(encode_qual(qual) for qual in todo))
+        finally:
+            await upQueue.put(None)
+
+    updater.update(stat_msg, f"‣ <b>File Name :</b> <b><i>{name}</i></b>\n\n<i>Ready to Encode...</i>")
+    async def ingest():
+        await stream.task
+        await db.saveJob(job_id, state="downloaded", dl_path=dl)
+
+    tasks = [create_task(encoder()), create_task(uploader())] + ([create_task(ingest())] if stream else [])
+    try:
+        await gather(*tasks)
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        for encoder in encoders:
+            await encoder.cancel_encode()
+        if stream:
+            stream.task.cancel()
+        await gather(*tasks, *([stream.task] if stream else []), return_exceptions=True)
+        await fail_job(job_id, dl)
+        await rep.report(f"Error: {e}, Cancelled, Retry Again!", "error")
+        updater.discard(stat_msg)
         await stat_msg.delete()
-        await aioremove(dl)
-    except Exception as error:
-        await rep.report(format_exc(), "error")
+        return
+    await db.finishJob(job_id)
+    updater.discard(stat_msg)
+    await stat_msg.delete()
+    await aioremove(dl)
 
 async def extra_utils(msg_id, out_path):
     msg = await bot.get_messages(Var.FILE_STORE, message_ids=msg_id)
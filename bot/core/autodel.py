@@ -0,0 +1,58 @@
+from math import ceil
+from time import time
+from datetime import datetime
+from asyncio import sleep as asleep, CancelledError
+from pyrogram.errors import FloodWait
+
+from bot import bot, bot_loop, Var, LOGS
+from .database import db
+
+class AutoDeleter:
+    def __init__(self, tick):
+        self.tick = max(1, tick)
+        self.__task = None
+
+    def start(self):
+        if self.__task:
+            return
+        self.__task = bot_loop.create_task(self.__wheel())
+        LOGS.info(f"Auto Delete Wheel Started with {self.tick}s Slots !!")
+
+    async def schedule(self, chat_id, msg_ids, delay):
+        slot = ceil((time() + delay) / self.tick) * self.tick
+        await db.addDeletes(chat_id, [msg_ids] if isinstance(msg_ids, int) else list(msg_ids), datetime.utcfromtimestamp(slot))
+
+    async def __wheel(self):
+        while True:
+            try:
+                while due := await db.getDueDeletes(datetime.utcnow()):
+                    chats = {}
+                    for slot in due:
+                        chats.setdefault(slot['chat_id'], []).extend(slot['msg_ids'])
+                    for chat_id, msg_ids in chats.items():
+                        await self.__delete(chat_id, list(dict.fromkeys(msg_ids)))
+                    await db.removeDeletes([slot['_id'] for slot in due])
+            except CancelledError:
+                raise
+            except Exception as e:
+                LOGS.error(f"Auto Delete Wheel Failed : {e}")
+            await asleep(self.tick - time() % self.tick)
+
+    async def __delete(self, chat_id, msg_ids):
+        for i in range(0, len(msg_ids), 100):
+            for _ in range(3):
+                try:
+                    await bot.delete_messages(chat_id, msg_ids[i:i + 100])
+                    break
+                except FloodWait as f:
+                    await asleep(f.value * 1.2)
+                except Exception as e:
+                    LOGS.warning(f"Auto Delete in {chat_id} Failed : {e}")
+                    break
+
+    def stop(self):
+        if self.__task:
+            self.__task.cancel()
+            self.__task = None
+
+autodel = AutoDeleter(Var.AUTO_DEL_TICK)
@@ -0,0 +1,123 @@
+from re import sub as resub, search as research, findall
+from os import path as ospath, makedirs
+from time import time
+from asyncio import create_subprocess_exec, create_subprocess_shell, gather
+from asyncio.subprocess import PIPE, DEVNULL
+
+from bot import Var, LOGS, ffpids_cache
+from .database import db
+from .ffencoder import ffargs, DEFAULT_FFARGS, max_kbps
+from .ffprogress import FFProgressParser, read_tail
+from .func_utils import convertBytes
+
+TUNE_DIR = ospath.join("encode", "autotune")
+TUNE_SIZES = {'1080': (1920, 1080), '720': (1280, 720), '480': (854, 480), '360': (640, 360)}
+TUNE_CLIPS = {
+    'testsrc': "testsrc2=size=1920x1080:rate=24000/1001",
+    'mandelbrot': "mandelbrot=size=1920x1080:rate=24000/1001",
+    'cellauto': "cellauto=size=1920x1080:rate=24000/1001:rule=18,format=yuv420p",
+}
+
+def profile_ffcode(ffcode, preset, crf):
+    for opt, val in (("-preset", preset), ("-crf", crf)):
+        if research(rf"(?<!\S){opt}\s+\S+", ffcode):
+            ffcode = resub(rf"(?<!\S){opt}\s+\S+", f"{opt} {val}", ffcode)
+        else:
+            ffcode = ffcode.replace("-progress '{}'", f"-progress '{{}}' {opt} {val}", 1)
+    return ffcode
+
+async def gen_clips(seconds):
+    makedirs(TUNE_DIR, exist_ok=True)
+    clips = {}
+    for name, src in TUNE_CLIPS.items():
+        path = ospath.join(TUNE_DIR, f"{name}_{seconds}s.mkv")
+        if not ospath.exists(path):
+            proc = await create_subprocess_exec("ffmpeg", "-hide_banner", "-y", "-f", "lavfi", "-i", src,
+                "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000", "-t", str(seconds),
+                "-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", "-pix_fmt", "yuv420p", "-c:a", "flac", path,
+                stdout=DEVNULL, stderr=DEVNULL)
+            await proc.wait()
+        if ospath.exists(path):
+            clips[name] = path
+    return clips
+
+async def measure_quality(out_path, ref_path, qual):
+    w, h = TUNE_SIZES.get(qual, (1920, 1080))
+    proc = await create_subprocess_exec("ffmpeg", "-hide_banner", "-i", out_path, "-i", ref_path, "-lavfi",
+        f"[0:v]split[d0][d1];[1:v]scale={w}:{h}:flags=bicubic,split[r0][r1];[d0][r0]ssim;[d1][r1]psnr",
+        "-f", "null", "-", stdout=DEVNULL, stderr=PIPE)
+    _, stderr = await proc.communicate()
+    text = stderr.decode(errors="ignore")
+    ssim = float(m.group(1)) if (m := research(r"SSIM .*All:([\d.]+)", text)) else 0.0
+    psnr = float(m.group(1)) if (m := research(r"PSNR .*average:([\d.]+|inf)", text)) else 0.0
+    return ssim, psnr
+
+async def bench_candidate(ffcode, clip, qual, seconds):
+    out_path = ospath.join(TUNE_DIR, f"out_{qual}.mkv")
+    ffcode = resub(r"(?<!\S)-map\s+(0:[as])(?=\s)", r"-map \1?", ffcode).replace("ffmpeg ", "ffmpeg -benchmark ", 1)
+    parser = FFProgressParser()
+    start = time()
+    proc = await create_subprocess_shell(ffcode.format(clip, "pipe:1", out_path), stdout=PIPE, stderr=PIPE)
+    ffpids_cache.append(proc.pid)
+    _, stderr, _ = await gather(parser.consume(proc.stdout), read_tail(proc.stderr), proc.wait())
+    ffpids_cache.remove(proc.pid)
+    wall = time() - start
+    if proc.returncode != 0 or not ospath.exists(out_path):
+        LOGS.error(f"Autotune Encode Failed : {stderr}")
+        return None
+    times = dict(findall(r"(utime|stime)=([\d.]+)s", stderr))
+    ssim, psnr = await measure_quality(out_path, clip, qual)
+    size = ospath.getsize(out_path)
+    return {
+        'fps': round(parser.progress.frame / wall, 2) if parser.progress.frame else 0.0,
+        'cpu': round(float(times.get('utime', 0)) + float(times.get('stime', 0)), 2),
+        'size': size,
+        'kbps': round(size * 8 / seconds / 1000, 1),
+        'ssim': ssim,
+        'psnr': psnr,
+    }
+
+async def autotune(quals, on_result=None):
+    clips = await gen_clips(Var.TUNE_CLIP_SECS)
+    if not clips:
+        raise Exception("No Test Clips could be Generated, Check FFmpeg lavfi Support")
+    results, profile = {}, {}
+    for qual in quals:
+        base = DEFAULT_FFARGS.get(qual) or ffargs[qual]
+        for preset in Var.TUNE_PRESETS.split():
+            for crf in Var.TUNE_CRFS.split():
+                ffcode, runs = profile_ffcode(base, preset, crf), []
+                for clip in clips.values():
+                    if res := await bench_candidate(ffcode, clip, qual, Var.TUNE_CLIP_SECS):
+                        runs.append(res)
+                if not runs:
+                    continue
+                avg = {key: sum(run[key] for run in runs) / len(runs) for key in runs[0]}
+                results.setdefault(qual, []).append((preset, crf, ffcode, avg))
+                if on_result:
+                    await on_result(qual, preset, crf, avg)
+        if not (cands := results.get(qual)):
+            continue
+        passing = [c for c in cands if c[3]['ssim'] >= Var.TUNE_MIN_SSIM and c[3]['kbps'] <= max_kbps(qual)]
+        best = max(passing, key=lambda c: c[3]['fps']) if passing else max(cands, key=lambda c: c[3]['ssim'])
+        profile[qual] = best[2]
+    if profile:
+        await db.saveProfile("auto", profile)
+    return results, profile
+
+def format_result(qual, preset, crf, avg):
+    return f"<b>{qual}p</b> <code>{preset}/crf{crf}</code> : {round(avg['fps'], 1)} fps, {round(avg['cpu'], 1)} cpu-s, {convertBytes(avg['size'])} ({round(avg['kbps'])} kbps), SSIM {round(avg['ssim'], 4)}, PSNR {round(avg['psnr'], 2)}"
+
+async def load_profile(name=None):
+    name = name or await db.getActiveProfile() or Var.ENCODE_PROFILE
+    if name == "default":
+        ffargs.update(DEFAULT_FFARGS)
+        return name
+    if not (profile := await db.getProfile(name)):
+        LOGS.warning(f"Encode Profile '{name}' Not Found, Using Default")
+        ffargs.update(DEFAULT_FFARGS)
+        return "default"
+    ffargs.update(DEFAULT_FFARGS)
+    ffargs.update(profile)
+    LOGS.info(f"Encode Profile '{name}' Loaded for {', '.join(profile)}")
+    return name
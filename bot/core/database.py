@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 from bot import Var
 
@@ -6,6 +7,25 @@ class MongoDB:
         self.__client = AsyncIOMotorClient(uri)
         self.__db = self.__client[database_name]
         self.__animes = self.__db.animes[Var.BOT_TOKEN.split(':')[0]]
+        self.__profiles = self.__db.profiles[Var.BOT_TOKEN.split(':')[0]]
+        self.__files = self.__db.files[Var.BOT_TOKEN.split(':')[0]]
+        self.__jobs = self.__db.jobs[Var.BOT_TOKEN.split(':')[0]]
+        self.__chats = self.__db.chats[Var.BOT_TOKEN.split(':')[0]]
+        self.__deletes = self.__db.deletes[Var.BOT_TOKEN.split(':')[0]]
+        self.__ani_names = self.__db.anilist.names
+        self.__ani_media = self.__db.anilist.media
+        self.__indexed = False
+
+    async def __ensure_indexes(self):
+        if self.__indexed:
+            return
+        for coll in (self.__ani_names, self.__ani_media):
+            await coll.create_index("expire_at", expireAfterSeconds=0)
+        await self.__files.create_index("hash", sparse=True)
+        await self.__jobs.create_index("expire_at", expireAfterSeconds=0)
+        await self.__jobs.create_index("state")
+        await self.__deletes.create_index("due")
+        self.__indexed = True
 
     async def getAnime(self, ani_id):
         botset = await self.__animes.find_one({'_id': ani_id})
@@ -18,6 +38,86 @@ class MongoDB:
         if post_id:
             await self.__animes.update_one({'_id': ani_id}, {'$set': {"msg_id": post_id}}, upsert=True)
 
+    async def getFile(self, uid):
+        return (await self.__files.find_one({'_id': uid})) or {}
+
+    async def getFileByHash(self, fhash):
+        return (await self.__files.find_one({'hash': fhash})) or {}
+
+    async def saveFileQual(self, uid, qual, msg_id, size, fhash=None):
+        await self.__ensure_indexes()
+        update = {f'quals.{qual}': {'msg_id': msg_id, 'size': size}, 'updated_at': datetime.utcnow()}
+        if fhash:
+            update['hash'] = fhash
+        await self.__files.update_one({'_id': uid}, {'$set': update}, upsert=True)
+
+    async def getJob(self, job_id):
+        return (await self.__jobs.find_one({'_id': job_id})) or {}
+
+    async def saveJob(self, job_id, **fields):
+        await self.__ensure_indexes()
+        now = datetime.utcnow()
+        await self.__jobs.update_one({'_id': job_id}, {'$set': {**fields, 'updated_at': now}, '$setOnInsert': {'created_at': now}}, upsert=True)
+
+    async def saveJobQual(self, job_id, qual, **fields):
+        update = {f'quals.{qual}.{key}': val for key, val in fields.items()}
+        await self.__jobs.update_one({'_id': job_id}, {'$set': {**update, 'updated_at': datetime.utcnow()}}, upsert=True)
+
+    async def finishJob(self, job_id, state="posted", ttl=604800):
+        await self.saveJob(job_id, state=state, expire_at=datetime.utcnow() + timedelta(seconds=ttl))
+
+    async def getPendingJobs(self):
+        return await self.__jobs.find({'state': {'$nin': ['posted', 'failed']}}).sort('created_at', 1).to_list(None)
+
+    async def saveFileSkip(self, uid, quals):
+        await self.__files.update_one({'_id': uid}, {'$set': {'skip': quals, 'updated_at': datetime.utcnow()}}, upsert=True)
+
+    async def getChatMeta(self, chat_id):
+        return (await self.__chats.find_one({'_id': chat_id})) or {}
+
+    async def saveChatMeta(self, chat_id, **fields):
+        await self.__chats.update_one({'_id': chat_id}, {'$set': {**fields, 'updated_at': datetime.utcnow()}}, upsert=True)
+
+    async def addDeletes(self, chat_id, msg_ids, due):
+        await self.__ensure_indexes()
+        await self.__deletes.update_one({'_id': f"{chat_id}:{int(due.timestamp())}"},
+            {'$set': {'chat_id': chat_id, 'due': due}, '$addToSet': {'msg_ids': {'$each': msg_ids}}}, upsert=True)
+
+    async def getDueDeletes(self, now, limit=500):
+        return await self.__deletes.find({'due': {'$lte': now}}).sort('due', 1).to_list(limit)
+
+    async def removeDeletes(self, ids):
+        await self.__deletes.delete_many({'_id': {'$in': ids}})
+
+    async def getAniName(self, key):
+        return await self.__ani_names.find_one({'_id': key})
+
+    async def getAniMedia(self, ani_id):
+        return ((await self.__ani_media.find_one({'_id': ani_id})) or {}).get('data', {})
+
+    async def saveAniNames(self, keys, ani_id, ttl):
+        await self.__ensure_indexes()
+        expire_at = datetime.utcnow() + timedelta(seconds=ttl)
+        for key in keys:
+            await self.__ani_names.update_one({'_id': key}, {'$set': {'ani_id': ani_id, 'expire_at': expire_at}}, upsert=True)
+
+    async def saveAniMedia(self, ani_id, data, ttl):
+        await self.__ensure_indexes()
+        expire_at = datetime.utcnow() + timedelta(seconds=ttl)
+        await self.__ani_media.update_one({'_id': ani_id}, {'$set': {'data': data, 'expire_at': expire_at}}, upsert=True)
+
+    async def getProfile(self, name):
+        return ((await self.__profiles.find_one({'_id': name})) or {}).get('ffargs', {})
+
+    async def saveProfile(self, name, ffargs):
+        await self.__profiles.update_one({'_id': name}, {'$set': {'ffargs': ffargs, 'updated_at': datetime.utcnow()}}, upsert=True)
+
+    async def getActiveProfile(self):
+        return ((await self.__profiles.find_one({'_id': '__active__'})) or {}).get('name')
+
+    async def setActiveProfile(self, name):
+        await self.__profiles.update_one({'_id': '__active__'}, {'$set': {'name': name}}, upsert=True)
+
     async def reboot(self):
         await self.__animes.drop()
 
@@ -0,0 +1,62 @@
+from asyncio import sleep as asleep, shield
+from pyrogram.errors import FloodWait, FileReferenceExpired, FileReferenceInvalid, MediaEmpty
+
+from bot import bot, bot_loop, Var, LOGS
+from .func_utils import LRUCache
+from .tgupdater import TokenBucket
+
+MEDIA_TYPES = ("document", "video", "audio", "animation", "photo", "voice", "video_note", "sticker")
+
+class FileDelivery:
+    def __init__(self, user_rate, global_rate):
+        self.__files = LRUCache(Var.FILE_CACHE_SIZE, ttl=6 * 3600)
+        self.__fetching = {}
+        self.__users = LRUCache(8192, ttl=300)
+        self.__user_rate = user_rate
+        self.__global = TokenBucket(global_rate, global_rate)
+
+    async def __fetch(self, msg_id):
+        msg = await bot.get_messages(Var.FILE_STORE, message_ids=msg_id)
+        if not msg or msg.empty:
+            return None
+        media = next((getattr(msg, kind) for kind in MEDIA_TYPES if getattr(msg, kind, None)), None)
+        return (media.file_id if media else None, msg.caption.html if msg.caption else "")
+
+    async def resolve(self, msg_id, refresh=False):
+        if not refresh and msg_id in self.__files:
+            return self.__files.get(msg_id)
+        if msg_id not in self.__fetching:
+            self.__fetching[msg_id] = bot_loop.create_task(self.__fetch(msg_id))
+        try:
+            item = await shield(self.__fetching[msg_id])
+        finally:
+            self.__fetching.pop(msg_id, None)
+        self.__files.set(msg_id, item, ttl=None if item else 60)
+        return item
+
+    async def __throttle(self, uid):
+        if not (bucket := self.__users.get(uid)):
+            bucket = TokenBucket(self.__user_rate, 3)
+            self.__users.set(uid, bucket)
+        await bucket.acquire()
+        await self.__global.acquire()
+
+    async def send(self, chat_id, msg_id):
+        if not (item := await self.resolve(msg_id)):
+            return None
+        for attempt in range(3):
+            await self.__throttle(chat_id)
+            file_id, caption = item
+            try:
+                if file_id:
+                    return await bot.send_cached_media(chat_id, file_id, caption=caption)
+                return await (await bot.get_messages(Var.FILE_STORE, message_ids=msg_id)).copy(chat_id, reply_markup=None)
+            except FloodWait as f:
+                LOGS.warning(f"FloodWait of {f.value}s while Delivering {msg_id}")
+                await asleep(f.value * 1.2)
+            except (FileReferenceExpired, FileReferenceInvalid, MediaEmpty):
+                if attempt or not (item := await self.resolve(msg_id, refresh=True)):
+                    raise
+        return None
+
+delivery = FileDelivery(Var.SEND_USER_RATE, Var.SEND_GLOBAL_RATE)
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from os import cpu_count
+from time import time
+
+from bot import Var, bot_loop, LOGS
+
+def _timed(func, args, kwargs):
+    started = time()
+    return started, func(*args, **kwargs)
+
+class NamedPool:
+    def __init__(self, name, factory, size):
+        self.name = name
+        self.size = size
+        self.submitted = 0
+        self.completed = 0
+        self.__factory = factory
+        self.__executor = None
+        self.__waits = deque(maxlen=200)
+        self.__runs = deque(maxlen=200)
+
+    @property
+    def executor(self):
+        if self.__executor is None:
+            self.__executor = self.__factory(max_workers=self.size)
+            LOGS.info(f"Executor Pool '{self.name}' Started with {self.size} Worker(s)")
+        return self.__executor
+
+    async def run(self, func, *args, **kwargs):
+        submitted = time()
+        self.submitted += 1
+        try:
+            started, res = await bot_loop.run_in_executor(self.executor, _timed, func, args, kwargs)
+        finally:
+            self.completed += 1
+        self.__waits.append(started - submitted)
+        self.__runs.append(time() - started)
+        return res
+
+    @property
+    def inflight(self):
+        return self.submitted - self.completed
+
+    @property
+    def depth(self):
+        return max(self.inflight - self.size, 0)
+
+    def stats(self):
+        avg = lambda vals: round(sum(vals) / len(vals), 3) if vals else 0.0
+        return {
+            "size": self.size,
+            "inflight": self.inflight,
+            "depth": self.depth,
+            "completed": self.completed,
+            "avg_wait": avg(self.__waits),
+            "max_wait": round(max(self.__waits, default=0.0), 3),
+            "avg_run": avg(self.__runs),
+        }
+
+    def shutdown(self, wait=False):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait, cancel_futures=True)
+            self.__executor = None
+
+class Executors:
+    def __init__(self):
+        self.__pools = {}
+
+    def register(self, name, factory, size):
+        self.__pools[name] = NamedPool(name, factory, max(1, size))
+
+    def __getitem__(self, name):
+        return self.__pools[name]
+
+    async def run(self, name, func, *args, **kwargs):
+        return await self.__pools[name].run(func, *args, **kwargs)
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self.__pools.items()}
+
+    def shutdown(self, wait=False):
+        for pool in self.__pools.values():
+            pool.shutdown(wait)
+
+executors = Executors()
+executors.register("io", ThreadPoolExecutor, Var.IO_WORKERS or min(32, (cpu_count() or 1) + 4))
@@ -1,15 +1,19 @@
-from re import findall
 from math import floor
 from time import time
-from os import path as ospath
-from aiofiles import open as aiopen
-from aiofiles.os import remove as aioremove, rename as aiorename
+from bisect import bisect_left
+from os import path as ospath, symlink, cpu_count
+from tempfile import mkdtemp
+from aiofiles.os import rename as aiorename
+from aioshutil import rmtree as aiormtree
 from shlex import split as ssplit
-from asyncio import sleep as asleep, gather, create_subprocess_shell, create_task
+from asyncio import gather, create_subprocess_shell, create_subprocess_exec
 from asyncio.subprocess import PIPE
 
 from bot import Var, bot_loop, ffpids_cache, LOGS
-from .func_utils import mediainfo, convertBytes, convertTime, sendMessage, editMessage
+from .func_utils import convertBytes, convertTime
+from .mediaprobe import probe_media, LADDER
+from .tgupdater import updater
+from .ffprogress import FFProgress, FFProgressParser, read_tail
 from .reporter import rep
 
 ffargs = {
@@ -18,10 +22,173 @@ ffargs = {
     '480': Var.FFCODE_480,
     '360': Var.FFCODE_360,
 }
+DEFAULT_FFARGS = dict(ffargs)
+
+_FF_IN, _FF_PROG, _FF_OUT = "FFIN__", "FFPROG__", "FFOUT__"
+_FF_FLAGS = {"-an", "-sn", "-dn", "-vn", "-shortest"}
+_FF_CODECS = {"libopus": "opus", "libvorbis": "vorbis", "libmp3lame": "mp3", "libfdk_aac": "aac", "aac": "aac", "flac": "flac", "ac3": "ac3"}
+_FF_VIDEO = {"-vf", "-s", "-pix_fmt", "-crf", "-qp", "-preset", "-tune", "-profile", "-level", "-x264-params", "-x265-params",
+             "-x264opts", "-g", "-keyint_min", "-sc_threshold", "-bf", "-refs", "-r", "-aspect", "-vcodec", "-maxrate", "-bufsize", "-threads"}
+
+def parse_ffcode(ffcode):
+    args = ssplit(ffcode.format(_FF_IN, _FF_PROG, _FF_OUT))
+    if args and ospath.basename(args[0]) == "ffmpeg":
+        args = args[1:]
+    in_opts, out_opts = [], []
+    cur, i = in_opts, 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "-i" and i + 1 < len(args) and args[i+1] == _FF_IN:
+            cur = out_opts
+            i += 2
+            continue
+        if arg == "-progress":
+            i += 2
+            continue
+        if arg not in (_FF_OUT, "-y"):
+            cur.append(arg)
+        i += 1
+    return in_opts, out_opts
+
+def rendition_opts(out_opts, idx):
+    opts, maps, size, vfs = [], [], None, []
+    vlabel = f"[v{idx}]"
+    i = 0
+    while i < len(out_opts):
+        arg = out_opts[i]
+        val = out_opts[i+1] if i + 1 < len(out_opts) else None
+        if arg in ("-s", "-s:v") and val:
+            size = val.replace("x", ":")
+        elif arg in ("-vf", "-filter:v") and val:
+            vfs.append(val)
+        elif arg == "-map" and val:
+            if val.startswith("0:v") or val.startswith("0:V"):
+                if vlabel not in maps:
+                    maps.append(vlabel)
+            elif val == "0":
+                maps.extend([vlabel, "0", "-0:v"])
+            else:
+                maps.append(val)
+        else:
+            opts.append(arg)
+            i += 1
+            continue
+        i += 2
+    if not maps:
+        maps = [vlabel, "0:a?", "0:s?"]
+    elif vlabel not in maps:
+        maps.insert(0, vlabel)
+    chain = ([f"scale={size}"] if size else []) + vfs
+    graph = f"[s{idx}]{','.join(chain) or 'null'}{vlabel}"
+    return [arg for m in maps for arg in ("-map", m)] + opts, graph
+
+def max_kbps(qual):
+    caps = dict(cap.split(":", 1) for cap in Var.TUNE_MAX_KBPS.split() if ":" in cap)
+    return float(caps.get(qual, "inf"))
+
+def can_remux(probe, qual):
+    if not Var.REMUX or not probe or qual not in LADDER or probe.vcodec != "h264" or probe.pix_fmt not in ("yuv420p", "yuvj420p"):
+        return False
+    width, height = LADDER[qual]
+    fits = probe.width <= width * 1.02 and probe.height <= height * 1.02
+    return fits and (probe.width == width or probe.height == height) and 0 < probe.video_kbps <= max_kbps(qual)
+
+def build_remux_ffcode(in_path, progress, out_path, qual, probe):
+    in_opts, out_opts = parse_ffcode(ffargs[qual])
+    _, rest, maps = split_video_opts(out_opts)
+    acodec = next((val for opt, val in zip(rest, rest[1:]) if opt in ("-c:a", "-acodec", "-codec:a")), None)
+    copy_audio = bool(probe.audio) and all(track.get("codec_name") == _FF_CODECS.get(acodec, acodec) for track in probe.audio)
+    maps = [arg for m in maps or ["0:v", "0:a?", "0:s?"] for arg in ("-map", m)]
+    return ["ffmpeg", "-hide_banner", "-y", *in_opts, "-i", in_path, "-nostats", "-progress", progress, *maps, *rest,
+            "-c:v", "copy", *(["-c:a", "copy"] if copy_audio else []), out_path]
+
+def split_video_opts(out_opts):
+    video, rest, maps, i = [], [], [], 0
+    while i < len(out_opts):
+        opt = out_opts[i]
+        if opt in _FF_FLAGS or i + 1 >= len(out_opts):
+            rest.append(opt)
+            i += 1
+            continue
+        val = out_opts[i+1]
+        name, _, spec = opt.partition(":")
+        if opt == "-map":
+            maps.append(val)
+        elif name not in ("-metadata", "-disposition") and (name in _FF_VIDEO or spec[:1] in ("v", "V")):
+            video.extend([opt, val])
+        else:
+            rest.extend([opt, val])
+        i += 2
+    return video, rest, maps
+
+def concat_maps(maps):
+    out = []
+    for m in maps or ["0:v", "0:a?", "0:s?"]:
+        neg, m = ("-", m[1:]) if m.startswith("-") else ("", m)
+        if m == "0":
+            out += ["0:v", f"{neg}1", "-1:v"]
+        elif m[:3] in ("0:v", "0:V"):
+            out += [] if "0:v" in out else ["0:v"]
+        elif m.startswith("0:"):
+            out.append(f"{neg}1:{m[2:]}")
+        else:
+            out.append(neg + m)
+    if "0:v" not in out:
+        out.insert(0, "0:v")
+    return [arg for m in out for arg in ("-map", m)]
+
+async def probe_keyframes(path):
+    proc = await create_subprocess_exec("ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+        "packet=pts_time,flags:format=start_time", "-of", "csv", path, stdout=PIPE, stderr=PIPE)
+    stdout, _ = await proc.communicate()
+    keyframes, frames, start = [], [], 0.0
+    for line in stdout.decode(errors="ignore").splitlines():
+        fields = line.split(",")
+        try:
+            if fields[0] == "packet":
+                frames.append(float(fields[1]))
+                if "K" in fields[2]:
+                    keyframes.append(float(fields[1]))
+            elif fields[0] == "format":
+                start = float(fields[1])
+        except (IndexError, ValueError):
+            continue
+    return sorted(keyframes), sorted(frames), start
+
+def chunk_bounds(keyframes, duration, count):
+    if not keyframes:
+        return []
+    bounds = [keyframes[0]]
+    for no in range(1, count):
+        idx = bisect_left(keyframes, bounds[0] + duration * no / count)
+        if idx < len(keyframes) and keyframes[idx] - bounds[-1] >= Var.CHUNK_MIN_SECS / 2:
+            bounds.append(keyframes[idx])
+    return bounds
+
+def build_multi_ffcode(in_path, progress, outputs):
+    in_opts = parse_ffcode(ffargs[outputs[0][0]])[0]
+    graphs, out_args = [f"[0:v:0]split={len(outputs)}" + "".join(f"[s{i}]" for i in range(len(outputs)))], []
+    for idx, (qual, out_path) in enumerate(outputs):
+        opts, graph = rendition_opts(parse_ffcode(ffargs[qual])[1], idx)
+        graphs.append(graph)
+        out_args.extend(opts + [out_path])
+    return ["ffmpeg", "-hide_banner", "-y", *in_opts, "-i", in_path, "-nostats", "-progress", progress,
+            "-filter_complex", ";".join(graphs), *out_args]
+
+def reap(proc):
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    if proc.pid in ffpids_cache:
+        ffpids_cache.remove(proc.pid)
 
 class FFEncoder:
-    def __init__(self, message, path, name, qual):
+    def __init__(self, message, path, name, qual, stream=None):
         self.__proc = None
+        self.__procs = []
+        self.stream = stream
         self.is_cancelled = False
         self.message = message
         self.__name = name
@@ -30,62 +197,208 @@ class FFEncoder:
         self.__total_time = None
         out_name = name if name.lower().endswith(".mkv") else f"{name}.mkv"
         self.out_path = ospath.join("encode", out_name)
-        self.__prog_file = 'prog.txt'
+        self.__workdir = None
+        self.__start = 0.0
+        self.__frames = []
+        self.parser = FFProgressParser()
+        self.parser.subscribe(self.progress)
         self.__start_time = time()
+        self.__updater = 0
 
-    async def progress(self):
-        self.__total_time = await mediainfo(self.dl_path, get_duration=True)
-        if isinstance(self.__total_time, str):
-            self.__total_time = 1.0
-        while not (self.__proc is None or self.is_cancelled):
-            async with aiopen(self.__prog_file, 'r+') as p:
-                text = await p.read()
-            if text:
-                time_done = floor(int(t[-1]) / 1000000) if (t := findall("out_time_ms=(\d+)", text)) else 1
-                ensize = int(s[-1]) if (s := findall(r"total_size=(\d+)", text)) else 0
-                diff = time() - self.__start_time
-                speed = ensize / diff
-                percent = round((time_done/self.__total_time)*100, 2)
-                tsize = ensize / (max(percent, 0.01)/100)
-                eta = (tsize-ensize)/max(speed, 0.01)
-                bar = floor(percent/8)*"█" + (12 - floor(percent/8))*"▒"
-                progress_str = f"""<blockquote>‣ <b>Anime Name :</b> <b><i>{self.__name}</i></b></blockquote>
+    async def progress(self, prog):
+        if self.is_cancelled or (time() - self.__updater < 8 and not prog.ended):
+            return
+        self.__updater = time()
+        ensize = prog.total_size
+        diff = time() - self.__start_time
+        speed = ensize / diff
+        percent = min(round((prog.out_time/self.__total_time)*100, 2), 100)
+        tsize = ensize / (max(percent, 0.01)/100)
+        eta = (tsize-ensize)/max(speed, 0.01)
+        bar = floor(percent/8)*"█" + (12 - floor(percent/8))*"▒"
+        progress_str = f"""<blockquote>‣ <b>Anime Name :</b> <b><i>{self.__name}</i></b></blockquote>
 <blockquote>‣ <b>Status :</b> <i>Encoding</i>
     <code>[{bar}]</code> {percent}%</blockquote> 
 <blockquote>   ‣ <b>Size :</b> {convertBytes(ensize)} out of ~ {convertBytes(tsize)}
-    ‣ <b>Speed :</b> {convertBytes(speed)}/s
+    ‣ <b>Speed :</b> {convertBytes(speed)}/s ( {prog.fps} fps, {prog.speed}x )
     ‣ <b>Time Took :</b> {convertTime(diff)}
     ‣ <b>Time Left :</b> {convertTime(eta)}</blockquote>
 <blockquote>‣ <b>File(s) Encoded:</b> <code>{Var.QUALS.index(self.__qual)} / {len(Var.QUALS)}</code></blockquote>"""
-                await editMessage(self.message, progress_str)
-                if (prog := findall(r"progress=(\w+)", text)) and prog[-1] == 'end':
-                    break
-            await asleep(8)
+        updater.update(self.message, progress_str)
 
     async def start_encode(self):
-        if ospath.exists(self.__prog_file):
-            await aioremove(self.__prog_file)
-        async with aiopen(self.__prog_file, 'w+'):
-            LOGS.info("Progress Temp Generated !")
-            pass
-        dl_npath, out_npath = ospath.join("encode", "ffanimeadvin.mkv"), ospath.join("encode", "ffanimeadvout.mkv")
-        await aiorename(self.dl_path, dl_npath)
-        ffcode = ffargs[self.__qual].format(dl_npath, self.__prog_file, out_npath)
-        LOGS.info(f'FFCode: {ffcode}')
-        self.__proc = await create_subprocess_shell(ffcode, stdout=PIPE, stderr=PIPE)
-        proc_pid = self.__proc.pid
-        ffpids_cache.append(proc_pid)
-        _, return_code = await gather(create_task(self.progress()), self.__proc.wait())
-        ffpids_cache.remove(proc_pid)
-        await aiorename(dl_npath, self.dl_path)
+        self.__start_time = time()
+        if self.stream:
+            await self.stream.wait(4 * 1024 * 1024)
+        self.__total_time = (await probe_media(self.dl_path)).duration or 1.0
+        self.__workdir = mkdtemp(prefix=f"{self.__qual}_", dir="encode")
+        dl_npath, out_npath = ospath.join(self.__workdir, "ffanimeadvin.mkv"), ospath.join(self.__workdir, "ffanimeadvout.mkv")
+        if not self.stream:
+            symlink(ospath.abspath(self.dl_path), dl_npath)
+        try:
+            if not self.stream and can_remux(probe := await probe_media(self.dl_path), self.__qual):
+                ffcode = build_remux_ffcode(dl_npath, "pipe:1", out_npath, self.__qual, probe)
+                LOGS.info(f'Remuxing {self.__name} as {probe.width}x{probe.height} {probe.vcodec} @ {round(probe.video_kbps)} kbps : {ffcode}')
+                self.__proc = await create_subprocess_exec(*ffcode, stdout=PIPE, stderr=PIPE)
+            elif Var.CHUNK_ENCODE and not self.stream and len(bounds := await self.__chunk_bounds(dl_npath)) > 1:
+                return await self.__chunked_encode(dl_npath, out_npath, bounds)
+            else:
+                ffcode = ffargs[self.__qual].format("pipe:0" if self.stream else dl_npath, "pipe:1", out_npath)
+                LOGS.info(f'FFCode: {ffcode}')
+                self.__proc = await create_subprocess_shell(ffcode, stdin=PIPE if self.stream else None, stdout=PIPE, stderr=PIPE)
+            ffpids_cache.append(self.__proc.pid)
+            try:
+                feed = [self.stream.feed(self.__proc)] if self.stream else []
+                _, stderr, _, *_ = await gather(self.parser.consume(self.__proc.stdout), read_tail(self.__proc.stderr), self.__proc.wait(), *feed)
+            finally:
+                reap(self.__proc)
+            if self.is_cancelled:
+                return
+            if self.__proc.returncode == 0:
+                if ospath.exists(out_npath):
+                    await aiorename(out_npath, self.out_path)
+                return self.out_path
+            else:
+                await rep.report(stderr, "error")
+        finally:
+            await aiormtree(self.__workdir, ignore_errors=True)
+
+    async def __chunk_bounds(self, path):
+        count = Var.CHUNK_COUNT or max(1, (cpu_count() or 1) // 4)
+        count = min(count, int(self.__total_time // max(Var.CHUNK_MIN_SECS, 1)))
+        if count < 2:
+            return []
+        try:
+            keyframes, self.__frames, self.__start = await probe_keyframes(path)
+            return chunk_bounds(keyframes, self.__total_time, count)
+        except Exception as e:
+            LOGS.warning(f"Keyframe Probe Failed, Encoding in One Pass : {e}")
+            return []
+
+    async def __run(self, args, parser=None):
+        proc = await create_subprocess_exec(*args, stdout=PIPE, stderr=PIPE)
+        self.__procs.append(proc)
+        ffpids_cache.append(proc.pid)
+        try:
+            _, stderr, _ = await gather(parser.consume(proc.stdout) if parser else read_tail(proc.stdout), read_tail(proc.stderr), proc.wait())
+        finally:
+            reap(proc)
+        if proc.returncode != 0 and not self.is_cancelled:
+            raise Exception(stderr)
+
+    async def __chunked_encode(self, in_path, out_path, bounds):
+        in_opts, out_opts = parse_ffcode(ffargs[self.__qual])
+        video, rest, maps = split_video_opts(out_opts)
+        if "-threads" not in video:
+            video += ["-threads", str(max(1, (cpu_count() or 1) // len(bounds)))]
+        progs = [FFProgress() for _ in bounds]
+        async def encode_chunk(no):
+            parser = FFProgressParser()
+            async def on_progress(prog):
+                progs[no] = prog
+                await self.progress(FFProgress.merge(progs))
+            parser.subscribe(on_progress)
+            seek = ["-ss", f"{max(bounds[no] - self.__start - 0.001, 0):.6f}"] if no else []
+            frames = bisect_left(self.__frames, bounds[no+1]) if no + 1 < len(bounds) else len(self.__frames)
+            dur = ["-frames:v", str(frames - bisect_left(self.__frames, bounds[no]))]
+            chunk = ospath.join(self.__workdir, f"chunk_{no:03d}.mkv")
+            await self.__run(["ffmpeg", "-hide_banner", "-y", *in_opts, *seek, "-i", in_path, *dur, "-nostats", "-progress", "pipe:1",
+                              "-map", "0:v:0", *video, "-an", "-sn", "-dn", chunk], parser)
+            return chunk
+        LOGS.info(f"Chunked Encode of {self.__name} in {len(bounds)} Parts at {', '.join(f'{b:.2f}' for b in bounds)}")
+        try:
+            chunks = await gather(*(encode_chunk(no) for no in range(len(bounds))))
+            if self.is_cancelled:
+                return
+            concat = ospath.join(self.__workdir, "chunks.txt")
+            with open(concat, "w") as f:
+                f.writelines(f"file '{ospath.abspath(chunk)}'\n" for chunk in chunks)
+            await self.__run(["ffmpeg", "-hide_banner", "-y", "-f", "concat", "-safe", "0", "-i", concat, "-i", in_path,
+                              *concat_maps(maps), *rest, "-c:v", "copy", out_path])
+        except Exception as e:
+            if not self.is_cancelled:
+                await rep.report(f"Chunked Encode Failed : {e}", "error")
+            return
         if self.is_cancelled:
             return
-        if return_code == 0:
-            if ospath.exists(out_npath):
-                await aiorename(out_npath, self.out_path)
-            return self.out_path
-        else:
-            await rep.report((await self.__proc.stderr.read()).decode().strip(), "error")
+        await aiorename(out_path, self.out_path)
+        return self.out_path
+
+    async def cancel_encode(self):
+        self.is_cancelled = True
+        for proc in [self.__proc, *self.__procs]:
+            if proc is not None:
+                try:
+                    proc.kill()
+                except:
+                    pass
+
+class FFMultiEncoder:
+    def __init__(self, message, path, names, stream=None):
+        self.__proc = None
+        self.stream = stream
+        self.is_cancelled = False
+        self.message = message
+        self.__names = names
+        self.dl_path = path
+        self.__total_time = None
+        self.out_paths = {qual: ospath.join("encode", name if name.lower().endswith(".mkv") else f"{name}.mkv") for qual, name in names.items()}
+        self.__workdir = None
+        self.__tmp_paths = {}
+        self.parser = FFProgressParser()
+        self.parser.subscribe(self.progress)
+        self.__start_time = time()
+        self.__updater = 0
+
+    async def progress(self, prog):
+        if self.is_cancelled or (time() - self.__updater < 8 and not prog.ended):
+            return
+        self.__updater = time()
+        sizes = {qual: ospath.getsize(path) if ospath.exists(path) else 0 for qual, path in self.__tmp_paths.items()}
+        ensize = sum(sizes.values())
+        diff = time() - self.__start_time
+        speed = ensize / diff
+        percent = min(round((prog.out_time/self.__total_time)*100, 2), 100)
+        eta = (diff / max(percent, 0.01)) * (100 - percent)
+        bar = floor(percent/8)*"█" + (12 - floor(percent/8))*"▒"
+        rends = "\n".join(f"    ‣ <b>{qual}p :</b> {convertBytes(size) or '0 B'} out of ~ {convertBytes(size / (max(percent, 0.01)/100))}" for qual, size in sizes.items())
+        progress_str = f"""<blockquote>‣ <b>Anime Name :</b> <b><i>{ospath.basename(self.dl_path)}</i></b></blockquote>
+<blockquote>‣ <b>Status :</b> <i>Encoding {len(sizes)} Renditions</i>
+    <code>[{bar}]</code> {percent}%</blockquote> 
+<blockquote>{rends}</blockquote>
+<blockquote>   ‣ <b>Speed :</b> {convertBytes(speed)}/s ( {prog.fps} fps, {prog.speed}x )
+    ‣ <b>Time Took :</b> {convertTime(diff)}
+    ‣ <b>Time Left :</b> {convertTime(eta)}</blockquote>"""
+        updater.update(self.message, progress_str)
+
+    async def start_encode(self):
+        self.__start_time = time()
+        if self.stream:
+            await self.stream.wait(4 * 1024 * 1024)
+        self.__total_time = (await probe_media(self.dl_path)).duration or 1.0
+        self.__workdir = mkdtemp(prefix="multi_", dir="encode")
+        self.__tmp_paths = {qual: ospath.join(self.__workdir, f"ffanimeadvout_{qual}.mkv") for qual in self.__names}
+        try:
+            ffcode = build_multi_ffcode("pipe:0" if self.stream else self.dl_path, "pipe:1", list(self.__tmp_paths.items()))
+            LOGS.info(f'FFCode: {ffcode}')
+            self.__proc = await create_subprocess_exec(*ffcode, stdin=PIPE if self.stream else None, stdout=PIPE, stderr=PIPE)
+            ffpids_cache.append(self.__proc.pid)
+            try:
+                feed = [self.stream.feed(self.__proc)] if self.stream else []
+                _, stderr, _, *_ = await gather(self.parser.consume(self.__proc.stdout), read_tail(self.__proc.stderr), self.__proc.wait(), *feed)
+            finally:
+                reap(self.__proc)
+            if self.is_cancelled:
+                return
+            if self.__proc.returncode == 0:
+                for qual, tmp_path in self.__tmp_paths.items():
+                    if ospath.exists(tmp_path):
+                        await aiorename(tmp_path, self.out_paths[qual])
+                return self.out_paths
+            else:
+                await rep.report(stderr, "error")
+        finally:
+            await aiormtree(self.__workdir, ignore_errors=True)
 
     async def cancel_encode(self):
         self.is_cancelled = True
@@ -0,0 +1,88 @@
+from inspect import isawaitable
+
+from bot import LOGS
+
+class FFProgress:
+    __slots__ = ("out_time", "fps", "speed", "total_size", "bitrate", "frame", "state")
+
+    def __init__(self, block=None):
+        block = block or {}
+        self.out_time = self.__time(block)
+        self.fps = self.__float(block.get("fps"))
+        self.speed = self.__float(block.get("speed", "").rstrip("x"))
+        self.total_size = int(self.__float(block.get("total_size")))
+        self.bitrate = self.__float(block.get("bitrate", "").replace("kbits/s", ""))
+        self.frame = int(self.__float(block.get("frame")))
+        self.state = block.get("progress", "continue")
+
+    @staticmethod
+    def __float(val):
+        try:
+            return float(val)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @classmethod
+    def __time(cls, block):
+        for key in ("out_time_us", "out_time_ms"):
+            if (us := cls.__float(block.get(key))) > 0:
+                return us / 1000000
+        try:
+            h, m, s = block.get("out_time", "").split(":")
+            return int(h) * 3600 + int(m) * 60 + float(s)
+        except ValueError:
+            return 0.0
+
+    @property
+    def ended(self):
+        return self.state == "end"
+
+    @classmethod
+    def merge(cls, progs):
+        merged = cls()
+        merged.out_time = sum(prog.out_time for prog in progs)
+        merged.fps = round(sum(prog.fps for prog in progs), 2)
+        merged.speed = round(sum(prog.speed for prog in progs), 3)
+        merged.total_size = sum(prog.total_size for prog in progs)
+        merged.bitrate = round(merged.total_size * 8 / merged.out_time / 1000, 1) if merged.out_time else 0.0
+        merged.frame = sum(prog.frame for prog in progs)
+        merged.state = "end" if progs and all(prog.ended for prog in progs) else "continue"
+        return merged
+
+class FFProgressParser:
+    def __init__(self):
+        self.progress = FFProgress()
+        self.__block = {}
+        self.__subs = []
+
+    def subscribe(self, callback):
+        self.__subs.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.__subs:
+            self.__subs.remove(callback)
+
+    async def feed(self, line):
+        key, sep, val = line.strip().partition("=")
+        if not sep:
+            return
+        self.__block[key] = val.strip()
+        if key != "progress":
+            return
+        self.progress, self.__block = FFProgress(self.__block), {}
+        for callback in list(self.__subs):
+            try:
+                if isawaitable(res := callback(self.progress)):
+                    await res
+            except Exception as e:
+                LOGS.error(f"FFProgress Subscriber Failed : {e}")
+
+    async def consume(self, stream):
+        while line := await stream.readline():
+            await self.feed(line.decode(errors="ignore"))
+
+async def read_tail(stream, size=4000):
+    tail = b""
+    while chunk := await stream.read(65536):
+        tail = (tail + chunk)[-size:]
+    return tail.decode(errors="ignore").strip()
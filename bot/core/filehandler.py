@@ -1,22 +1,260 @@
 from os import path as ospath
+from json import dumps, loads
+from math import ceil, floor
+from time import time
+from asyncio import Queue, Condition, gather, sleep as asleep, wait, FIRST_COMPLETED
 from aiofiles import open as aiopen
-from aiofiles.os import path as aiopath, mkdir
+from aiofiles.os import path as aiopath, mkdir, remove as aioremove
+from pyrogram.errors import FloodWait
 
-from bot import LOGS
-from bot.core.func_utils import handle_logs
+from bot import LOGS, Var, bot, bot_loop
+from bot.core.func_utils import handle_logs, convertBytes, convertTime
+from bot.core.tgupdater import updater
+
+CHUNK_SIZE = 1024 * 1024
+STREAM_EXTS = (".mkv", ".webm")
+STREAM_MIMES = ("video/x-matroska", "video/webm")
+MP4_EXTS = (".mp4", ".m4v", ".mov")
+MP4_MIMES = ("video/mp4", "video/quicktime")
+
+def moov_first(head):
+    pos = 0
+    while pos + 8 <= len(head):
+        size, box = int.from_bytes(head[pos:pos+4], "big"), head[pos+4:pos+8]
+        if box == b"moov":
+            return True
+        if box == b"mdat":
+            return False
+        if size == 1 and pos + 16 <= len(head):
+            size = int.from_bytes(head[pos+8:pos+16], "big")
+        if size < 8:
+            return False
+        pos += size
+    return False
+
+class IngestStream:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.ready = 0
+        self.error = None
+        self.task = None
+        self.__cond = Condition()
+
+    @property
+    def done(self):
+        return self.ready >= self.size
+
+    async def advance(self, ready):
+        async with self.__cond:
+            self.ready = max(self.ready, min(ready, self.size))
+            self.__cond.notify_all()
+
+    async def fail(self, error):
+        async with self.__cond:
+            self.error = error or Exception("Download Failed")
+            self.__cond.notify_all()
+
+    async def wait(self, offset=None):
+        offset = self.size - 1 if offset is None else min(offset, self.size - 1)
+        async with self.__cond:
+            await self.__cond.wait_for(lambda: self.ready > offset or self.error)
+        if self.ready <= offset:
+            raise self.error
+
+    async def feed(self, proc):
+        offset, ready, exited = 0, None, bot_loop.create_task(proc.wait())
+        try:
+            async with aiopen(self.path, "rb") as f:
+                while offset < self.size and not exited.done():
+                    ready = bot_loop.create_task(self.wait(offset))
+                    await wait([ready, exited], return_when=FIRST_COMPLETED)
+                    if not ready.done():
+                        ready.cancel()
+                        break
+                    ready.result()
+                    await f.seek(offset)
+                    chunk = await f.read(min(CHUNK_SIZE, self.ready - offset))
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+                    offset += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            LOGS.error(f"Stream Ingest Failed : {e}")
+            proc.kill()
+        finally:
+            exited.cancel()
+            if ready:
+                ready.cancel()
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
 
 class FileHandler:
     def __init__(self, path="."):
         self.__downdir = path
-        
+        self.__name = ""
+        self.__message = None
+        self.__start = time()
+        self.__updater = 0
+        self.__done = 0
+        self.__workers = 0
+
     @handle_logs
-    async def save_file(self, message, filename=None):
+    async def save_file(self, message, filename=None, stat_msg=None):
         try:
             if not filename:
                 filename = message.document.file_name or "video_file"
             file_path = ospath.join(self.__downdir, filename)
-            await message.download(file_path)
+            self.__name, self.__message, self.__start = filename, stat_msg, time()
+            size = getattr(message.document, "file_size", 0) or 0
+            part_size = Var.DL_PART_MB * CHUNK_SIZE
+            if Var.DL_WORKERS <= 1 or size < part_size * 2:
+                await message.download(file_path, progress=self.progress_status)
+            else:
+                await self.__parallel_download(message, file_path, size, part_size)
             return file_path
         except Exception as e:
             LOGS.error(str(e))
             return None
+
+    async def streamable(self, message):
+        doc = message.document
+        if not doc or not getattr(doc, "file_size", 0):
+            return False
+        name, mime = (doc.file_name or "").lower(), getattr(doc, "mime_type", "") or ""
+        if name.endswith(STREAM_EXTS) or mime in STREAM_MIMES:
+            return True
+        if name.endswith(MP4_EXTS) or mime in MP4_MIMES:
+            async for head in bot.stream_media(message, limit=1):
+                return moov_first(head)
+        return False
+
+    def stream_file(self, message, filename=None):
+        filename = filename or message.document.file_name or "video_file"
+        file_path = ospath.join(self.__downdir, filename)
+        self.__name, self.__start = filename, time()
+        size = message.document.file_size
+        stream = IngestStream(file_path, size)
+
+        async def run():
+            try:
+                await self.__parallel_download(message, file_path, size, Var.DL_PART_MB * CHUNK_SIZE, stream)
+            except BaseException as e:
+                await stream.fail(e if isinstance(e, Exception) else Exception("Download Cancelled"))
+                raise
+        stream.task = bot_loop.create_task(run())
+        return stream
+
+    async def __load_state(self, state_path, uid, size, part_size):
+        if await aiopath.exists(state_path):
+            try:
+                async with aiopen(state_path, "r") as f:
+                    state = loads(await f.read())
+                if state.get("uid") == uid and state.get("size") == size and state.get("part") == part_size:
+                    return bytearray.fromhex(state["bitmap"])
+            except Exception as e:
+                LOGS.warning(f"Download State Corrupted, Restarting : {e}")
+        return bytearray(ceil(size / part_size))
+
+    async def __save_state(self, state_path, uid, size, part_size, bitmap):
+        async with aiopen(state_path, "w") as f:
+            await f.write(dumps({"uid": uid, "size": size, "part": part_size, "bitmap": bitmap.hex()}))
+
+    async def __parallel_download(self, message, file_path, size, part_size, stream=None):
+        uid = message.document.file_unique_id
+        state_path = f"{file_path}.parts"
+        bitmap = await self.__load_state(state_path, uid, size, part_size)
+        if not any(bitmap) or not await aiopath.exists(file_path):
+            bitmap = bytearray(len(bitmap))
+            async with aiopen(file_path, "wb") as f:
+                await f.truncate(size)
+        await self.__save_state(state_path, uid, size, part_size, bitmap)
+        parts = Queue()
+        for no, done in enumerate(bitmap):
+            if done:
+                self.__done += min(part_size, size - no * part_size)
+            else:
+                parts.put_nowait(no)
+        if self.__done:
+            LOGS.info(f"Resuming Download of {self.__name} from {convertBytes(self.__done)}")
+        self.__workers = max(1, min(Var.DL_WORKERS, parts.qsize()))
+
+        async def advance():
+            prefix = 0
+            while prefix < len(bitmap) and bitmap[prefix]:
+                prefix += 1
+            await stream.advance(prefix * part_size)
+        if stream:
+            await advance()
+
+        async def worker():
+            async with aiopen(file_path, "r+b") as f:
+                while not parts.empty():
+                    no = parts.get_nowait()
+                    want = min(part_size, size - no * part_size)
+                    for attempt in range(5):
+                        got = 0
+                        try:
+                            await f.seek(no * part_size)
+                            async for chunk in bot.stream_media(message, offset=no * (part_size // CHUNK_SIZE), limit=part_size // CHUNK_SIZE):
+                                await f.write(chunk)
+                                got += len(chunk)
+                                self.__done += len(chunk)
+                                await self.progress_status(self.__done, size)
+                            if got != want:
+                                raise Exception(f"Short Read, Got {got} of {want} Bytes")
+                            break
+                        except FloodWait as fw:
+                            self.__done -= got
+                            if attempt == 4:
+                                raise
+                            await asleep(fw.value * 1.2)
+                        except Exception as e:
+                            self.__done -= got
+                            if attempt == 4:
+                                raise
+                            LOGS.warning(f"Download Part {no} Failed : {e}, Retrying")
+                            await asleep(2 ** attempt)
+                    bitmap[no] = 1
+                    await self.__save_state(state_path, uid, size, part_size, bitmap)
+                    if stream:
+                        await advance()
+
+        tasks = [bot_loop.create_task(worker()) for _ in range(self.__workers)]
+        try:
+            await gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await gather(*tasks, return_exceptions=True)
+            await self.__save_state(state_path, uid, size, part_size, bitmap)
+            raise
+        if not all(bitmap):
+            raise Exception("Download Incomplete, Parts Missing")
+        await aioremove(state_path)
+
+    async def progress_status(self, current, total):
+        now = time()
+        if not self.__message or ((now - self.__updater) < 7 and current != total):
+            return
+        self.__updater = now
+        diff = max(now - self.__start, 0.01)
+        percent = round(current / max(total, 1) * 100, 2)
+        speed = current / diff
+        eta = round((total - current) / max(speed, 0.01))
+        bar = floor(percent/8)*"█" + (12 - floor(percent/8))*"▒"
+        progress_str = f"""‣ <b>Anime Name :</b> <b><i>{self.__name}</i></b>
+
+‣ <b>Status :</b> <i>Downloading</i>
+    <code>[{bar}]</code> {percent}%
+
+    ‣ <b>Size :</b> {convertBytes(current)} out of ~ {convertBytes(total)}
+    ‣ <b>Speed :</b> {convertBytes(speed)}/s
+    ‣ <b>Time Took :</b> {convertTime(diff)}
+    ‣ <b>Time Left :</b> {convertTime(eta)}
+
+‣ <b>Connections :</b> <code>{self.__workers or 1}</code>"""
+        updater.update(self.__message, progress_str)
@@ -1,17 +1,18 @@
-from multiprocessing import cpu_count
-from concurrent.futures import ThreadPoolExecutor
-from functools import partial, wraps
+from functools import wraps
 from json import loads as jloads
 from re import findall
 from math import floor
-from os import path as ospath
-from time import time, sleep
+from os import path as ospath, kill
+from signal import SIGKILL
+from time import time
+from datetime import datetime
 from traceback import format_exc
-from asyncio import sleep as asleep, create_subprocess_shell
+from asyncio import sleep as asleep, create_subprocess_shell, gather, as_completed, Semaphore
 from asyncio.subprocess import PIPE
 from base64 import urlsafe_b64encode, urlsafe_b64decode
+from hashlib import sha1
+from collections import OrderedDict
 
-from aiohttp import ClientSession
 from aiofiles import open as aiopen
 from aioshutil import rmtree as aiormtree
 from html_telegraph_poster import TelegraphPoster
@@ -20,8 +21,55 @@ from pyrogram.enums import ChatMemberStatus
 from pyrogram.types import InlineKeyboardButton
 from pyrogram.errors import MessageNotModified, FloodWait, UserNotParticipant, ReplyMarkupInvalid, MessageIdInvalid
 
-from bot import bot, bot_loop, LOGS, Var
+from bot import bot, bot_loop, LOGS, Var, ffpids_cache
+from .database import db
 from .reporter import rep
+from .httpclient import http_client
+from .executors import executors
+
+class LRUCache:
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__data = OrderedDict()
+
+    def __expired(self, key):
+        _, expiry = self.__data[key]
+        if expiry is not None and expiry < time():
+            del self.__data[key]
+            return True
+        return False
+
+    def __contains__(self, key):
+        return key in self.__data and not self.__expired(key)
+
+    def __len__(self):
+        return len(self.__data)
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.__data.move_to_end(key)
+        return self.__data[key][0]
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        self.__data[key] = (value, time() + ttl if ttl else None)
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.maxsize:
+            self.__data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.__data.pop(key, None)
+        return value
+
+    def clear(self):
+        self.__data.clear()
+
+fsub_cache = LRUCache(16384, ttl=Var.FSUB_TTL)
+fsub_limit = Semaphore(max(Var.FSUB_WORKERS, 1))
+chat_meta = dict()
 
 def handle_logs(func):
     @wraps(func)
@@ -32,9 +80,8 @@ def handle_logs(func):
             await rep.report(format_exc(), "error")
     return wrapper
     
-async def sync_to_async(func, *args, wait=True, **kwargs):
-    pfunc = partial(func, *args, **kwargs)
-    future = bot_loop.run_in_executor(ThreadPoolExecutor(max_workers=cpu_count() * 125), pfunc)
+async def sync_to_async(func, *args, wait=True, pool="io", **kwargs):
+    future = bot_loop.create_task(executors.run(pool, func, *args, **kwargs))
     return await future if wait else future
     
 def new_task(func):
@@ -45,7 +92,8 @@ def new_task(func):
 
 async def getfeed(link, index=0):
     try:
-        feed = await sync_to_async(feedparse, link)
+        _, content, _ = await http_client.get(link, read="text")
+        feed = await sync_to_async(feedparse, content)
         return feed.entries[index]
     except IndexError:
         return None
@@ -55,9 +103,7 @@ async def getfeed(link, index=0):
 
 @handle_logs
 async def aio_urldownload(link):
-    async with ClientSession() as sess:
-        async with sess.get(link) as data:
-            image = await data.read()
+    _, image, _ = await http_client.get(link, read="bytes")
     path = f"thumbs/{link.split('/')[-1]}"
     if not path.endswith((".jpg" or ".png")):
         path += ".jpg"
@@ -68,9 +114,9 @@ async def aio_urldownload(link):
 @handle_logs
 async def get_telegraph(out):
     client = TelegraphPoster(use_api=True)
-    client.create_api_token("Mediainfo")
+    await sync_to_async(client.create_api_token, "Mediainfo")
     uname = Var.BRAND_UNAME.lstrip('@')
-    page = client.post(
+    page = await sync_to_async(client.post,
         title="Mediainfo",
         author=uname,
         author_url=f"https://t.me/{uname}",
@@ -91,7 +137,7 @@ async def sendMessage(chat, text, buttons=None, get_error=False, **kwargs):
                                     reply_markup=buttons, **kwargs)
     except FloodWait as f:
         await rep.report(f, "warning")
-        sleep(f.value * 1.2)
+        await asleep(f.value * 1.2)
         return await sendMessage(chat, text, buttons, get_error, **kwargs)
     except ReplyMarkupInvalid:
         return await sendMessage(chat, text, None, get_error, **kwargs)
@@ -109,7 +155,7 @@ async def editMessage(msg, text, buttons=None, get_error=False, **kwargs):
                                         reply_markup=buttons, **kwargs)
     except FloodWait as f:
         await rep.report(f, "warning")
-        sleep(f.value * 1.2)
+        await asleep(f.value * 1.2)
         return await editMessage(msg, text, buttons, get_error, **kwargs)
     except ReplyMarkupInvalid:
         return await editMessage(msg, text, None, get_error, **kwargs)
@@ -127,37 +173,92 @@ async def encode(string):
 async def decode(b64_str):
     return urlsafe_b64decode((b64_str.strip("=") + "=" * (-len(b64_str.strip("=")) % 4)).encode("ascii")).decode("ascii")
 
-async def is_fsubbed(uid):
-    if len(Var.FSUB_CHATS) == 0:
+async def fsub_status(chat_id, uid):
+    if fsub_cache.get((chat_id, uid)):
         return True
-    for chat_id in Var.FSUB_CHATS:
+    async with fsub_limit:
         try:
             member = await bot.get_chat_member(chat_id=chat_id, user_id=uid)
         except UserNotParticipant:
             return False
         except Exception as err:
             await rep.report(format_exc(), "warning")
-            continue
+            return None
+    if member.status in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED):
+        return False
+    fsub_cache.set((chat_id, uid), True)
+    return True
+
+def fsub_updated(update):
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+    if update.new_chat_member and update.new_chat_member.status not in (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED):
+        fsub_cache.set((update.chat.id, member.user.id), True)
+    else:
+        fsub_cache.pop((update.chat.id, member.user.id))
+
+async def is_fsubbed(uid):
+    chats = [chat_id for chat_id in Var.FSUB_CHATS if chat_id and not fsub_cache.get((chat_id, uid))]
+    if not chats:
+        return True
+    tasks = [bot_loop.create_task(fsub_status(chat_id, uid)) for chat_id in chats]
+    try:
+        for task in as_completed(tasks):
+            if await task is False:
+                return False
+    finally:
+        for task in tasks:
+            task.cancel()
     return True
         
+async def load_chat_meta(chat_id, refresh=False):
+    meta = chat_meta.get(chat_id) or await db.getChatMeta(chat_id)
+    fresh = meta.get('updated_at') and (datetime.utcnow() - meta['updated_at']).total_seconds() < Var.FSUB_META_TTL
+    if meta.get('invite_link') and fresh and not refresh:
+        chat_meta[chat_id] = meta
+        return meta
+    try:
+        cha = await bot.get_chat(chat_id)
+        link = meta.get('invite_link')
+        if link:
+            try:
+                inv = await bot.get_chat_invite_link(chat_id, link)
+                link = None if inv.is_revoked or (inv.expire_date and inv.expire_date < datetime.now()) else link
+            except Exception:
+                link = None
+        if not link:
+            link = cha.invite_link or (await bot.create_chat_invite_link(chat_id=chat_id)).invite_link
+        await db.saveChatMeta(chat_id, title=cha.title, invite_link=link)
+        chat_meta[chat_id] = {'title': cha.title, 'invite_link': link, 'updated_at': datetime.utcnow()}
+    except Exception as err:
+        await rep.report(f"Chat Info of {chat_id} Failed : {err}", "warning")
+        if not meta.get('invite_link'):
+            return None
+        chat_meta[chat_id] = meta
+    return chat_meta[chat_id]
+
+async def refresh_chat_meta(refresh=True):
+    for chat_id in Var.FSUB_CHATS:
+        if chat_id:
+            await load_chat_meta(chat_id, refresh)
+            await asleep(1)
+
 async def get_fsubs(uid, txtargs):
     txt = "<b><i>Please Join Following Channels to Use this Bot!</i></b>\n\n"
     btns = []
-    for no, chat in enumerate(Var.FSUB_CHATS, start=1):
-        try:
-            cha = await bot.get_chat(chat)
-            member = await bot.get_chat_member(chat_id=chat, user_id=uid)
-            sta = "Joined ✅️"
-        except UserNotParticipant:
-            sta = "Not Joined ❌️"
-            inv = await bot.create_chat_invite_link(chat_id=chat)
-            btns.append([InlineKeyboardButton(cha.title, url=inv.invite_link)])
-        except Exception as err:
-            await rep.report(format_exc(), "warning")
+    chats = [chat_id for chat_id in Var.FSUB_CHATS if chat_id]
+    status = await gather(*(fsub_status(chat, uid) for chat in chats))
+    for no, (chat, joined) in enumerate(zip(chats, status), start=1):
+        if joined is None or not (meta := chat_meta.get(chat) or await load_chat_meta(chat)):
             continue
-        txt += f"<b>{no}. Title :</b> <i>{cha.title}</i>\n  <b>Status :</b> <i>{sta}</i>\n\n"
+        sta = "Joined ✅️"
+        if not joined:
+            sta = "Not Joined ❌️"
+            btns.append([InlineKeyboardButton(meta['title'], url=meta['invite_link'])])
+        txt += f"<b>{no}. Title :</b> <i>{meta['title']}</i>\n  <b>Status :</b> <i>{sta}</i>\n\n"
     if len(txtargs) > 1:
-        btns.append([InlineKeyboardButton('🗂 Get Files', url=f'https://t.me/{(await bot.get_me()).username}?start={txtargs[1]}')])
+        btns.append([InlineKeyboardButton('🗂 Get Files', url=f'https://t.me/{bot.me.username}?start={txtargs[1]}')])
     return txt, btns
 
 async def mediainfo(file, get_json=False, get_duration=False):
@@ -183,6 +284,27 @@ async def clean_up():
     except Exception as e:
         LOGS.error(str(e))
 
+def kill_ffpids():
+    for pid in list(ffpids_cache):
+        try:
+            LOGS.info(f"Process ID : {pid}")
+            kill(pid, SIGKILL)
+        except (OSError, ProcessLookupError):
+            LOGS.error("Killing Process Failed !!")
+
+def partial_hash(path, chunk=4 * 1024 * 1024):
+    size = ospath.getsize(path)
+    digest = sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(chunk))
+        if size > chunk * 2:
+            f.seek(size // 2)
+            digest.update(f.read(chunk))
+        if size > chunk:
+            f.seek(max(size - chunk, chunk))
+            digest.update(f.read(chunk))
+    return digest.hexdigest()
+
 def convertTime(s: int) -> str:
     m, s = divmod(int(s), 60)
     hr, m = divmod(m, 60)
@@ -0,0 +1,86 @@
+from asyncio import Semaphore, sleep as asleep, TimeoutError as AsyncTimeout
+from email.utils import parsedate_to_datetime
+from time import time
+from urllib.parse import urlsplit
+
+from aiohttp import ClientSession, ClientTimeout, ClientError, TCPConnector
+
+from bot import Var, LOGS
+
+class HTTPClient:
+    def __init__(self, limit=100, per_host=8, timeout=30, retries=3, dns_ttl=600, max_delay=60):
+        self.__session = None
+        self.__limit = limit
+        self.__per_host = per_host
+        self.__timeout = timeout
+        self.__dns_ttl = dns_ttl
+        self.__max_delay = max_delay
+        self.retries = retries
+        self.__hosts = {}
+
+    async def start(self):
+        if self.__session is None or self.__session.closed:
+            self.__session = ClientSession(
+                connector=TCPConnector(limit=self.__limit, limit_per_host=self.__per_host, ttl_dns_cache=self.__dns_ttl, keepalive_timeout=60),
+                timeout=ClientTimeout(total=self.__timeout, sock_connect=10)
+            )
+            LOGS.info("HTTP Client Session Started !!")
+        return self.__session
+
+    async def close(self):
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
+        self.__session = None
+
+    def __host(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.__hosts:
+            self.__hosts[host] = Semaphore(self.__per_host)
+        return self.__hosts[host]
+
+    def __delay(self, headers, attempt):
+        if after := (headers or {}).get("Retry-After"):
+            try:
+                return min(float(after), self.__max_delay)
+            except ValueError:
+                try:
+                    return min(max(parsedate_to_datetime(after).timestamp() - time(), 0), self.__max_delay)
+                except (TypeError, ValueError):
+                    pass
+        return min(2 ** attempt, self.__max_delay)
+
+    @staticmethod
+    async def __read(resp, read):
+        if read == "bytes":
+            return await resp.read()
+        if read == "text":
+            return await resp.text()
+        try:
+            return await resp.json(content_type=None)
+        except ValueError:
+            return {}
+
+    async def request(self, method, url, read="json", retries=None, **kwargs):
+        session = await self.start()
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                async with self.__host(url), session.request(method, url, **kwargs) as resp:
+                    if not (resp.status == 429 or resp.status >= 500) or attempt == retries:
+                        return resp.status, await self.__read(resp, read), resp.headers
+                    delay = self.__delay(resp.headers, attempt)
+                    LOGS.warning(f"HTTP {resp.status} from {urlsplit(url).netloc}, Retrying in {delay}s")
+            except (ClientError, AsyncTimeout) as e:
+                if attempt == retries:
+                    raise
+                delay = self.__delay(None, attempt)
+                LOGS.warning(f"HTTP {method} {urlsplit(url).netloc} Failed : {e!r}, Retrying in {delay}s")
+            await asleep(delay)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+http_client = HTTPClient(Var.HTTP_POOL_LIMIT, Var.HTTP_HOST_LIMIT, Var.HTTP_TIMEOUT, Var.HTTP_RETRIES)
@@ -0,0 +1,112 @@
+from json import loads
+from os import path as ospath, stat as osstat
+from asyncio import create_subprocess_exec
+from asyncio.subprocess import PIPE
+from pycountry import languages
+
+from bot import LOGS
+from .func_utils import LRUCache
+
+LADDER = {'1080': (1920, 1080), '720': (1280, 720), '480': (854, 480), '360': (640, 360)}
+probe_cache = LRUCache(64, ttl=6 * 3600)
+
+def lang_name(code):
+    if not code or code in ("und", "zxx", "mis"):
+        return ""
+    try:
+        lang = languages.get(alpha_3=code) or languages.get(bibliographic=code) or languages.get(alpha_2=code)
+    except (KeyError, LookupError):
+        lang = None
+    return lang.name if lang else code.title()
+
+def parse_duration(val):
+    try:
+        if ":" not in str(val):
+            return float(val)
+        h, m, s = str(val).split(":")
+        return int(h) * 3600 + int(m) * 60 + float(s)
+    except (TypeError, ValueError):
+        return 0.0
+
+class MediaProbe:
+    __slots__ = ("duration", "size", "bitrate", "format", "width", "height", "vcodec", "pix_fmt", "vbitrate", "fps", "streams")
+
+    def __init__(self, data=None):
+        data = data or {}
+        fmt, self.streams = data.get("format") or {}, data.get("streams") or []
+        video = next((s for s in self.streams if s.get("codec_type") == "video" and not (s.get("disposition") or {}).get("attached_pic")), {})
+        self.format = fmt.get("format_name", "")
+        self.size = int(fmt.get("size") or 0)
+        self.bitrate = int(fmt.get("bit_rate") or 0)
+        self.duration = parse_duration(fmt.get("duration")) or parse_duration(video.get("duration")) \
+            or parse_duration((video.get("tags") or {}).get("DURATION"))
+        self.width, self.height = int(video.get("width") or 0), int(video.get("height") or 0)
+        self.vcodec = video.get("codec_name", "")
+        self.pix_fmt = video.get("pix_fmt", "")
+        self.vbitrate = int(video.get("bit_rate") or (video.get("tags") or {}).get("BPS") or 0)
+        num, _, den = (video.get("avg_frame_rate") or "0/1").partition("/")
+        self.fps = round(float(num) / float(den), 3) if den and float(den) else 0.0
+
+    def __tracks(self, kind):
+        return [s for s in self.streams if s.get("codec_type") == kind]
+
+    @property
+    def audio(self):
+        return self.__tracks("audio")
+
+    @property
+    def subtitles(self):
+        return self.__tracks("subtitle")
+
+    @staticmethod
+    def __langs(tracks):
+        names = []
+        for track in tracks:
+            if (name := lang_name((track.get("tags") or {}).get("language"))) and name not in names:
+                names.append(name)
+        return names
+
+    @property
+    def audio_langs(self):
+        return self.__langs(self.audio)
+
+    @property
+    def sub_langs(self):
+        return self.__langs(self.subtitles)
+
+    @property
+    def video_kbps(self):
+        if self.vbitrate:
+            return self.vbitrate / 1000
+        audio = sum(int(track.get("bit_rate") or (track.get("tags") or {}).get("BPS") or 0) for track in self.audio)
+        return max(self.bitrate - audio, 0) / 1000
+
+    def upscales(self, qual):
+        if qual not in LADDER or not self.width or not self.height:
+            return False
+        width, height = LADDER[qual]
+        return width > self.width * 1.05 and height > self.height * 1.05
+
+async def probe_media(path, refresh=False):
+    try:
+        st = osstat(path)
+    except OSError:
+        return MediaProbe()
+    key = (ospath.realpath(path), st.st_dev, st.st_ino)
+    if not refresh and (probe := probe_cache.get(key)) and probe.size >= st.st_size:
+        return probe
+    proc = await create_subprocess_exec("ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path,
+                                        stdout=PIPE, stderr=PIPE)
+    stdout, stderr = await proc.communicate()
+    try:
+        probe = MediaProbe(loads(stdout.decode(errors="ignore") or "{}"))
+    except ValueError:
+        LOGS.error(f"FFProbe Failed for {path} : {stderr.decode(errors='ignore')[-300:]}")
+        probe = MediaProbe()
+    probe.size = max(probe.size, st.st_size)
+    probe_cache.set(key, probe)
+    return probe
+
+def trim_ladder(probe, quals):
+    keep = [qual for qual in quals if not probe.upscales(qual)]
+    return keep or [min(quals, key=lambda qual: LADDER.get(qual, (0, 0))[1])]
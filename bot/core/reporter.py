@@ -1,12 +1,22 @@
-from time import sleep
+from asyncio import Event, sleep as asleep, wait_for, TimeoutError as AsyncTimeout
+from collections import deque
 from pyrogram.errors import FloodWait
-from bot import Var, LOGS, bot
+from bot import Var, LOGS, bot, bot_loop
 
 class Reporter:
-    def __init__(self, client, chat_id, log):
+    def __init__(self, client, chat_id, log, interval=10, max_lines=300):
         self.__client = client
         self.__cid = chat_id
         self.__logger = log
+        self.__interval = interval
+        self.__max_lines = max_lines
+        self.__lines = deque()
+        self.__size = 0
+        self.__last = None
+        self.__repeats = 0
+        self.__dropped = 0
+        self.__event = Event()
+        self.__task = None
 
     async def report(self, msg, log_type, log=True):
         txt = [f"[{log_type.upper()}] {msg}", log_type.lower()]
@@ -19,11 +29,66 @@ class Reporter:
         else:
             self.__logger.info(txt[0])
         if log and self.__cid != 0:
+            self.__push(txt[0][:4095], txt[1] in ("error", "critical"))
+
+    def __push(self, line, urgent):
+        if line == self.__last:
+            self.__repeats += 1
+            return
+        self.__close_repeats()
+        self.__last = line
+        if len(self.__lines) >= self.__max_lines:
+            self.__dropped += 1
+            if not urgent:
+                return
+            self.__size -= len(self.__lines.popleft()) + 1
+        self.__append(line)
+        if urgent or self.__size >= 4096:
+            self.__event.set()
+        if self.__task is None or self.__task.done():
+            self.__task = bot_loop.create_task(self.__worker())
+
+    def __append(self, line):
+        self.__lines.append(line)
+        self.__size += len(line) + 1
+
+    def __close_repeats(self):
+        if self.__repeats:
+            self.__append(f"[INFO] Last Message Repeated {self.__repeats} Time(s)")
+            self.__repeats = 0
+
+    async def __worker(self):
+        while True:
+            try:
+                await wait_for(self.__event.wait(), self.__interval)
+            except AsyncTimeout:
+                pass
+            self.__event.clear()
+            await self.flush()
+
+    def __next_batch(self):
+        batch, size = [], 0
+        while self.__lines and (not batch or size + len(self.__lines[0]) + 1 <= 4096):
+            line = self.__lines.popleft()
+            self.__size -= len(line) + 1
+            batch.append(line[:4095])
+            size += len(batch[-1]) + 1
+        return batch
+
+    async def flush(self):
+        self.__close_repeats()
+        self.__last = None
+        if self.__dropped:
+            self.__append(f"[WARNING] Log Shipper Behind, Dropped {self.__dropped} Line(s)")
+            self.__dropped = 0
+        while batch := self.__next_batch():
             try:
-                await self.__client.send_message(self.__cid, f"{txt[0][:4096]}")
+                await self.__client.send_message(self.__cid, "\n".join(batch))
             except FloodWait as f:
                 self.__logger.warning(str(f))
-                sleep(f.value * 1.5)
+                self.__lines.extendleft(reversed(batch))
+                self.__size += sum(len(line) + 1 for line in batch)
+                await asleep(f.value * 1.5)
             except Exception as err:
                 self.__logger.error(str(err))
 
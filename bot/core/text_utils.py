@@ -1,14 +1,15 @@
 from calendar import month_name
 from datetime import datetime
 from random import choice
-from asyncio import sleep as asleep
-from aiohttp import ClientSession
+from asyncio import Semaphore, gather
 from anitopy import parse
 import re
 
 from bot import Var, bot
 from .ffencoder import ffargs
-from .func_utils import handle_logs
+from .func_utils import handle_logs, LRUCache
+from .database import db
+from .httpclient import http_client
 from .reporter import rep
 
 CAPTION_FORMAT = """
@@ -18,8 +19,8 @@ CAPTION_FORMAT = """
 <b>⊙</b> <i>Status:</i> <i>{status}</i> 
 <b>⊙</b> <i>Source:</i> <i>{source}</i>
 <b>⊙</b> <i>Episode:</i> <i>{ep_no}</i>
-<b>⊙</b> <i>Audio: Japanese</i>
-<b>⊙</b> <i>Subtitle: English</i>
+<b>⊙</b> <i>Audio: {audio}</i>
+<b>⊙</b> <i>Subtitle: {subtitle}</i>
 <b>╰┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅</b>
 ╭┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅┅
 ⌬  <b><i>Powered By</i></b> ~ </i></b><b><i>{cred}</i></b>
@@ -41,9 +42,7 @@ GENRES_EMOJI = {
     "Thriller": "🔪"
 }
 
-ANIME_GRAPHQL_QUERY = """
-query ($id: Int, $search: String, $seasonYear: Int) {
-  Media(id: $id, type: ANIME, format_not_in: [MOVIE, MUSIC, MANGA, NOVEL, ONE_SHOT], search: $search, seasonYear: $seasonYear) {
+ANIME_FIELDS = """
     id
     idMal
     title {
@@ -66,21 +65,28 @@ query ($id: Int, $search: String, $seasonYear: Int) {
     synonyms
     averageScore
     siteUrl
-  }
-}
 """
 
+ANIME_GRAPHQL_QUERY = """
+query ($id: Int, $search: String, $seasonYear: Int) {
+  Media(id: $id, type: ANIME, format_not_in: [MOVIE, MUSIC, MANGA, NOVEL, ONE_SHOT], search: $search, seasonYear: $seasonYear) {%s}
+}
+""" % ANIME_FIELDS
+
+ANIME_BATCH_ALIAS = """
+  a%(no)d: Media(type: ANIME, format_not_in: [MOVIE, MUSIC, MANGA, NOVEL, ONE_SHOT], search: $s%(no)d, seasonYear: $y%(no)d) {%(fields)s}"""
+
 class AniLister:
     def __init__(self, anime_name: str, year: int) -> None:
         self.__api = "https://graphql.anilist.co"
         self.__ani_name = anime_name
         self.__ani_year = year
         self.__vars = {'search': self.__ani_name, 'seasonYear': self.__ani_year}
+        self.status = None
 
     async def __post(self):
-        async with ClientSession() as sess:
-            async with sess.post(self.__api, json={'query': ANIME_GRAPHQL_QUERY, 'variables': self.__vars}) as resp:
-                return resp.status, await resp.json(), resp.headers
+        self.status, resp_json, res_heads = await http_client.post(self.__api, json={'query': ANIME_GRAPHQL_QUERY, 'variables': self.__vars})
+        return self.status, resp_json, res_heads
 
     async def get_anidata(self):
         res_code, resp_json, res_heads = await self.__post()
@@ -94,22 +100,71 @@ class AniLister:
             res_code, resp_json, res_heads = await self.__post()
         if res_code == 200:
             return resp_json.get('data', {}).get('Media', {}) or {}
-        if res_code == 429:
-            f_timer = int(res_heads.get('Retry-After', 5))
-            await rep.report(f"AniList API FloodWait: {res_code}, Sleeping for {f_timer}", "warning")
-            await asleep(f_timer)
-            return await self.get_anidata()
-        if res_code in (500, 501, 502):
-            await rep.report(f"AniList Server Error: {res_code}, retrying", "warning")
-            await asleep(5)
-            return await self.get_anidata()
         await rep.report(f"AniList API Error: {res_code}", "error", log=False)
         return {}
 
+    @staticmethod
+    async def batch_search(names, year, chunk=10):
+        results = {}
+        for i in range(0, len(names), chunk):
+            part = names[i:i+chunk]
+            args = ", ".join(f"$s{no}: String, $y{no}: Int" for no in range(len(part)))
+            aliases = "".join(ANIME_BATCH_ALIAS % {'no': no, 'fields': ANIME_FIELDS} for no in range(len(part)))
+            try:
+                _, resp_json, _ = await http_client.post("https://graphql.anilist.co", json={
+                    'query': f"query ({args}) {{{aliases}\n}}",
+                    'variables': {**{f"s{no}": name for no, name in enumerate(part)}, **{f"y{no}": year for no in range(len(part))}}
+                })
+            except Exception as e:
+                await rep.report(f"AniList Batch Query Failed: {e}", "warning", log=False)
+                continue
+            data = (resp_json.get('data') or {}) if isinstance(resp_json, dict) else {}
+            for no, name in enumerate(part):
+                results[name] = data.get(f"a{no}") or {}
+        return results
+
+class AniCache:
+    def __init__(self):
+        self.__names = LRUCache(2048)
+        self.__media = LRUCache(512, Var.ANI_CACHE_TTL)
+
+    @staticmethod
+    def key(name, year):
+        return f"{re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()}|{year}"
+
+    async def lookup(self, key):
+        if key in self.__names:
+            ani_id = self.__names.get(key)
+        elif doc := await db.getAniName(key):
+            ani_id = doc.get('ani_id')
+            self.__names.set(key, ani_id, Var.ANI_CACHE_TTL if ani_id else Var.ANI_NEG_TTL)
+        else:
+            return False, {}
+        if ani_id is None:
+            return True, {}
+        if not (data := self.__media.get(ani_id)):
+            if not (data := await db.getAniMedia(ani_id)):
+                return False, {}
+            self.__media.set(ani_id, data)
+        return True, data
+
+    async def save(self, keys, data):
+        ani_id = (data or {}).get('id')
+        ttl = Var.ANI_CACHE_TTL if ani_id else Var.ANI_NEG_TTL
+        for key in keys:
+            self.__names.set(key, ani_id, ttl)
+        await db.saveAniNames(keys, ani_id, ttl)
+        if ani_id:
+            self.__media.set(ani_id, data)
+            await db.saveAniMedia(ani_id, data, ttl)
+
+anicache = AniCache()
+
 class TextEditor:
     def __init__(self, name):
         self.__name = name or ""
         self.adata = {}
+        self.probe = None
         self.pdata = parse(self.__name or "")
         self._parsed = self._parse_filename(self.__name or "")
 
@@ -156,7 +211,8 @@ class TextEditor:
 
     @handle_logs
     async def load_anilist(self):
-        cache_names = []
+        cache_names, tried = [], []
+        year = datetime.now().year
         for option in ((False, False), (False, True), (True, False), (True, True)):
             ani_name = await self.parse_name(*option)
             if not ani_name:
@@ -164,9 +220,20 @@ class TextEditor:
             if ani_name in cache_names:
                 continue
             cache_names.append(ani_name)
-            self.adata = await AniLister(ani_name, datetime.now().year).get_anidata()
+            key = anicache.key(ani_name, year)
+            hit, self.adata = await anicache.lookup(key)
+            if hit:
+                if self.adata:
+                    break
+                continue
+            lister = AniLister(ani_name, year)
+            self.adata = await lister.get_anidata()
+            if self.adata or lister.status in (200, 404):
+                tried.append(key)
             if self.adata:
                 break
+        if tried:
+            await anicache.save(tried, self.adata)
 
     @handle_logs
     async def get_id(self):
@@ -246,5 +313,32 @@ class TextEditor:
             status=status,
             source=self.adata.get("source") or "Subsplease",
             ep_no=ep_no,
+            audio=", ".join(self.probe.audio_langs if self.probe else []) or "Japanese",
+            subtitle=", ".join(self.probe.sub_langs if self.probe else []) or "English",
             cred=Var.BRAND_UNAME
         )
+
+async def batch_load_anilist(editors, concurrency=5):
+    year = datetime.now().year
+    pending = []
+    for editor in editors:
+        if not (name := await editor.parse_name()):
+            continue
+        key = anicache.key(name, year)
+        hit, data = await anicache.lookup(key)
+        if hit:
+            editor.adata = data
+        else:
+            pending.append((editor, name, key))
+    if pending:
+        results = await AniLister.batch_search(list(dict.fromkeys(name for _, name, _ in pending)), year)
+        for editor, name, key in pending:
+            if data := results.get(name):
+                editor.adata = data
+                await anicache.save([key], data)
+    sem = Semaphore(concurrency)
+    async def load(editor):
+        async with sem:
+            await editor.load_anilist()
+    await gather(*(load(editor) for editor in editors if not editor.adata))
+    return editors
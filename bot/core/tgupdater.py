@@ -0,0 +1,126 @@
+from asyncio import Event, sleep as asleep, wait_for, TimeoutError as AsyncTimeout
+from collections import OrderedDict
+from time import time
+
+from pyrogram.errors import FloodWait, MessageNotModified, MessageIdInvalid, ReplyMarkupInvalid
+
+from bot import Var, bot_loop, LOGS
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.__stamp = time()
+
+    def __refill(self):
+        now = time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.__stamp) * self.rate)
+        self.__stamp = now
+
+    def delay(self):
+        self.__refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.__refill()
+        self.tokens -= 1
+
+    def give(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    async def acquire(self):
+        while (wait := self.delay()) > 0:
+            await asleep(wait)
+        self.take()
+
+class MessageUpdater:
+    def __init__(self, chat_rate, global_rate):
+        self.__pending = OrderedDict()
+        self.__sent = OrderedDict()
+        self.__chats = {}
+        self.__blocked = {}
+        self.__chat_rate = chat_rate
+        self.__global = TokenBucket(global_rate, global_rate)
+        self.__event = Event()
+        self.__task = None
+
+    @staticmethod
+    def __key(msg):
+        return (msg.chat.id, msg.id)
+
+    def update(self, msg, text, buttons=None, **kwargs):
+        if not msg or not hasattr(msg, "edit_text"):
+            return
+        key = self.__key(msg)
+        if buttons is None and self.__sent.get(key) == text:
+            self.__pending.pop(key, None)
+            return
+        self.__pending.pop(key, None)
+        self.__pending[key] = (msg, text, buttons, kwargs)
+        self.__event.set()
+        if self.__task is None or self.__task.done():
+            self.__task = bot_loop.create_task(self.__worker())
+
+    def discard(self, msg):
+        if msg and hasattr(msg, "chat"):
+            key = self.__key(msg)
+            self.__pending.pop(key, None)
+            self.__sent.pop(key, None)
+
+    def __bucket(self, chat_id):
+        if chat_id not in self.__chats:
+            self.__chats[chat_id] = TokenBucket(self.__chat_rate, 3)
+        return self.__chats[chat_id]
+
+    def __delay(self, chat_id):
+        return max(self.__blocked.get(chat_id, 0) - time(), self.__bucket(chat_id).delay(), 0)
+
+    async def __worker(self):
+        while True:
+            if not self.__pending:
+                self.__event.clear()
+                await self.__event.wait()
+                continue
+            delays = {key: self.__delay(key[0]) for key in self.__pending}
+            key = min(delays, key=delays.get)
+            if delays[key] > 0:
+                self.__event.clear()
+                try:
+                    await wait_for(self.__event.wait(), delays[key])
+                except AsyncTimeout:
+                    pass
+                continue
+            await self.__global.acquire()
+            if (item := self.__pending.pop(key, None)) is None:
+                self.__global.give()
+                continue
+            self.__bucket(key[0]).take()
+            msg, text, buttons, kwargs = item
+            await self.__edit(key, msg, text, buttons, kwargs)
+
+    async def __edit(self, key, msg, text, buttons, kwargs):
+        try:
+            await msg.edit_text(text=text, disable_web_page_preview=True, reply_markup=buttons, **kwargs)
+        except FloodWait as f:
+            LOGS.warning(f"Updater FloodWait in {key[0]} : {f.value}s")
+            self.__blocked[key[0]] = time() + f.value * 1.2
+            if key not in self.__pending:
+                self.__pending[key] = (msg, text, buttons, kwargs)
+            return
+        except ReplyMarkupInvalid:
+            return await self.__edit(key, msg, text, None, kwargs)
+        except MessageNotModified:
+            pass
+        except MessageIdInvalid:
+            self.__sent.pop(key, None)
+            return
+        except Exception as e:
+            LOGS.error(f"Updater Edit Failed in {key[0]} : {e}")
+            return
+        self.__sent[key] = text
+        self.__sent.move_to_end(key)
+        while len(self.__sent) > 1000:
+            self.__sent.popitem(last=False)
+
+updater = MessageUpdater(Var.EDIT_CHAT_RATE, Var.EDIT_GLOBAL_RATE)
@@ -1,14 +1,25 @@
-from time import time, sleep
+from time import time
 from traceback import format_exc
-from math import floor
+from math import ceil, floor
+from json import dumps, loads
 from os import path as ospath
-from aiofiles.os import remove as aioremove
-from pyrogram.errors import FloodWait
+from asyncio import Queue, gather, sleep as asleep
+from aiofiles import open as aiopen
+from aiofiles.os import remove as aioremove, path as aiopath
+from pyrogram import raw, types, utils
+from pyrogram.enums import ParseMode
+from pyrogram.errors import FloodWait, FilePartMissing
+from pyrogram.session import Session
 
-from bot import bot, Var
-from .func_utils import editMessage, sendMessage, convertBytes, convertTime
+from bot import bot, Var, LOGS
+from .func_utils import convertBytes, convertTime
+from .mediaprobe import probe_media
+from .tgupdater import updater
 from .reporter import rep
 
+PART_SIZE = 512 * 1024
+BIG_FILE = 10 * 1024 * 1024
+
 class TgUploader:
     def __init__(self, message):
         self.cancelled = False
@@ -17,57 +28,153 @@ class TgUploader:
         self.__qual = ""
         self.__client = bot
         self.__start = time()
-        self.__updater = time()
+        self.__updater = 0
+        self.__done = 0
+        self.__file_id = 0
+        self.__parts = bytearray()
 
     async def upload(self, path, qual):
         self.__name = ospath.basename(path)
         self.__qual = qual
+        self.__start = time()
+        state_path = f"{path}.upload"
         try:
-            if Var.AS_DOC:
-                return await self.__client.send_document(chat_id=Var.FILE_STORE,
-                    document=path,
-                    thumb="thumb.jpg" if ospath.exists("thumb.jpg") else None,
-                    caption=f"<i>{self.__name}</i>",
-                    force_document=True,
-                    progress=self.progress_status
-                )
-            else:
-                return await self.__client.send_video(chat_id=Var.FILE_STORE,
-                    document=path,
-                    thumb="thumb.jpg" if ospath.exists("thumb.jpg") else None,
-                    caption=f"<i>{self.__name}</i>",
-                    progress=self.progress_status
-                )
-        except FloodWait as e:
-            sleep(e.value * 1.5)
-            return await upload(path, qual, thumbnail)
+            size = await aiopath.getsize(path)
+            await self.__load_state(state_path, size)
+            await self.__save_parts(path, size, state_path)
+            msg = await self.__send_media(path, size, state_path)
         except Exception as e:
             await rep.report(format_exc(), "error")
             raise e
+        await aioremove(path)
+        if await aiopath.exists(state_path):
+            await aioremove(state_path)
+        return msg
+
+    async def __load_state(self, state_path, size):
+        total = ceil(size / PART_SIZE)
+        if await aiopath.exists(state_path):
+            try:
+                async with aiopen(state_path, "r") as f:
+                    state = loads(await f.read())
+                if state.get("size") == size and len(parts := bytearray.fromhex(state["parts"])) == total:
+                    self.__file_id, self.__parts = state["file_id"], parts
+                    LOGS.info(f"Resuming Upload of {self.__name} from Part {sum(parts)}/{total}")
+                    return
+            except Exception as e:
+                LOGS.warning(f"Upload State Corrupted, Restarting : {e}")
+        self.__file_id, self.__parts = self.__client.rnd_id(), bytearray(total)
+
+    async def __save_state(self, state_path, size):
+        async with aiopen(state_path, "w") as f:
+            await f.write(dumps({"file_id": self.__file_id, "size": size, "parts": self.__parts.hex()}))
+
+    async def __save_parts(self, path, size, state_path):
+        total, is_big = len(self.__parts), size > BIG_FILE
+        parts = Queue()
+        self.__done = 0
+        for no, done in enumerate(self.__parts):
+            if done:
+                self.__done += min(PART_SIZE, size - no * PART_SIZE)
+            else:
+                parts.put_nowait(no)
+        if parts.empty():
+            return
+        await self.__save_state(state_path, size)
+        storage = self.__client.storage
+        session = Session(self.__client, await storage.dc_id(), await storage.auth_key(), await storage.test_mode(), is_media=True)
+        await session.start()
+
+        async def worker():
+            async with aiopen(path, "rb") as f:
+                while not parts.empty():
+                    no = parts.get_nowait()
+                    await f.seek(no * PART_SIZE)
+                    chunk = await f.read(PART_SIZE)
+                    if is_big:
+                        rpc = raw.functions.upload.SaveBigFilePart(file_id=self.__file_id, file_part=no, file_total_parts=total, bytes=chunk)
+                    else:
+                        rpc = raw.functions.upload.SaveFilePart(file_id=self.__file_id, file_part=no, bytes=chunk)
+                    for attempt in range(5):
+                        if self.cancelled:
+                            raise Exception("Upload Cancelled")
+                        try:
+                            if not await session.invoke(rpc):
+                                raise Exception("Part Not Saved")
+                            break
+                        except FloodWait as fw:
+                            await asleep(fw.value * 1.2)
+                        except Exception as e:
+                            if attempt == 4:
+                                raise
+                            LOGS.warning(f"Upload Part {no} Failed : {e}, Retrying")
+                            await asleep(2 ** attempt)
+                    self.__parts[no] = 1
+                    self.__done += len(chunk)
+                    if no % 32 == 0:
+                        await self.__save_state(state_path, size)
+                    await self.progress_status(self.__done, size)
+
+        try:
+            await gather(*(worker() for _ in range(max(1, min(Var.UL_WORKERS, parts.qsize())))))
         finally:
-            await aioremove(path)
+            await self.__save_state(state_path, size)
+            await session.stop()
+
+    async def __send_media(self, path, size, state_path):
+        thumb = await self.__client.save_file("thumb.jpg") if ospath.exists("thumb.jpg") else None
+        attributes = [raw.types.DocumentAttributeFilename(file_name=self.__name)]
+        if not Var.AS_DOC:
+            probe = await probe_media(path)
+            attributes.append(raw.types.DocumentAttributeVideo(duration=int(probe.duration), w=probe.width, h=probe.height, supports_streaming=True))
+        random_id = self.__client.rnd_id()
+        for _ in range(len(self.__parts) + 5):
+            total = len(self.__parts)
+            if size > BIG_FILE:
+                file = raw.types.InputFileBig(id=self.__file_id, parts=total, name=self.__name)
+            else:
+                file = raw.types.InputFile(id=self.__file_id, parts=total, name=self.__name, md5_checksum="")
+            try:
+                r = await self.__client.invoke(raw.functions.messages.SendMedia(
+                    peer=await self.__client.resolve_peer(Var.FILE_STORE),
+                    media=raw.types.InputMediaUploadedDocument(mime_type="video/x-matroska", file=file, thumb=thumb,
+                        force_file=Var.AS_DOC or None, attributes=attributes),
+                    random_id=random_id,
+                    **await utils.parse_text_entities(self.__client, f"<i>{self.__name}</i>", ParseMode.HTML, None)
+                ))
+            except FloodWait as fw:
+                await asleep(fw.value * 1.2)
+                continue
+            except FilePartMissing as e:
+                LOGS.warning(f"Upload Part {e.value} Missing on Server, Re-Uploading")
+                self.__parts[int(e.value)] = 0
+                await self.__save_parts(path, size, state_path)
+                continue
+            for upd in r.updates:
+                if isinstance(upd, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                    return await types.Message._parse(self.__client, upd.message, {u.id: u for u in r.users}, {c.id: c for c in r.chats})
+            raise Exception("Upload Not Confirmed by Telegram")
+        raise Exception("Upload Failed, Too Many Retries")
 
     async def progress_status(self, current, total):
-        if self.cancelled:
-            self.__client.stop_transmission()
         now = time()
-        diff = now - self.__start
+        diff = max(now - self.__start, 0.01)
         if (now - self.__updater) >= 7 or current == total:
             self.__updater = now
             percent = round(current / total * 100, 2)
-            speed = current / diff 
-            eta = round((total - current) / speed)
+            speed = current / diff
+            eta = round((total - current) / max(speed, 0.01))
             bar = floor(percent/8)*"█" + (12 - floor(percent/8))*"▒"
             progress_str = f"""‣ <b>Anime Name :</b> <b><i>{self.__name}</i></b>
 
 ‣ <b>Status :</b> <i>Uploading</i>
     <code>[{bar}]</code> {percent}%
-    
+
     ‣ <b>Size :</b> {convertBytes(current)} out of ~ {convertBytes(total)}
     ‣ <b>Speed :</b> {convertBytes(speed)}/s
     ‣ <b>Time Took :</b> {convertTime(diff)}
     ‣ <b>Time Left :</b> {convertTime(eta)}
 
 ‣ <b>File(s) Encoded:</b> <code>{Var.QUALS.index(self.__qual)} / {len(Var.QUALS)}</code>"""
-            
-            await editMessage(self.message, progress_str)
+
+            updater.update(self.message, progress_str)
@@ -0,0 +1,79 @@
+from asyncio import Queue, CancelledError, wait
+from time import time
+
+from bot import Var, bot_loop, LOGS
+
+class EncodePool:
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self.active = 0
+        self.__queue = Queue()
+        self.__tasks = []
+        self.__waits = []
+
+    def start(self):
+        if self.__tasks:
+            return
+        self.__tasks = [bot_loop.create_task(self.__worker(no)) for no in range(self.workers)]
+        LOGS.info(f"Encode Pool Started with {self.workers} Worker(s) !!")
+
+    async def __worker(self, no):
+        while True:
+            func, args, kwargs, fut, queued = await self.__queue.get()
+            try:
+                if fut.cancelled():
+                    continue
+                self.__waits = (self.__waits + [time() - queued])[-50:]
+                self.active += 1
+                task = None
+                try:
+                    task = bot_loop.create_task(func(*args, **kwargs))
+                    fut.add_done_callback(lambda _, task=task: task.cancel())
+                    await wait([task])
+                    if task.cancelled() or fut.done():
+                        fut.cancel()
+                    elif task.exception():
+                        fut.set_exception(task.exception())
+                    else:
+                        fut.set_result(task.result())
+                except CancelledError:
+                    if task:
+                        task.cancel()
+                    if not fut.done():
+                        fut.cancel()
+                    raise
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                finally:
+                    self.active -= 1
+            finally:
+                self.__queue.task_done()
+
+    async def submit(self, func, *args, **kwargs):
+        self.start()
+        fut = bot_loop.create_future()
+        self.__queue.put_nowait((func, args, kwargs, fut, time()))
+        return await fut
+
+    @property
+    def pending(self):
+        return self.__queue.qsize()
+
+    @property
+    def busy(self):
+        return self.active + self.pending >= self.workers
+
+    @property
+    def avg_wait(self):
+        return sum(self.__waits) / len(self.__waits) if self.__waits else 0.0
+
+    async def join(self):
+        await self.__queue.join()
+
+    def stop(self):
+        for task in self.__tasks:
+            task.cancel()
+        self.__tasks.clear()
+
+ffpool = EncodePool(Var.ENCODE_WORKERS)
@@ -1,12 +1,18 @@
-from asyncio import sleep as asleep
+from re import search as research
 from pyrogram import filters
 from pyrogram.filters import command, private, user
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from bot import bot, bot_loop, Var, ani_cache
 from bot.core.database import db
-from bot.core.func_utils import decode, is_fsubbed, get_fsubs, editMessage, sendMessage, new_task, convertTime, getfeed
+from bot.core.func_utils import decode, is_fsubbed, get_fsubs, fsub_updated, editMessage, sendMessage, new_task, convertTime, getfeed
 from bot.core.auto_animes import get_animes, process_file
 from bot.core.reporter import rep
+from bot.core.executors import executors
+from bot.core.tgupdater import updater
+from bot.core.delivery import delivery
+from bot.core.autodel import autodel
+from bot.core.workers import ffpool
+from bot.core.autotune import autotune, format_result, load_profile
 
 @bot.on_message(command('start') & private)
 @new_task
@@ -50,23 +56,22 @@ async def start_msg(client, message):
             await editMessage(temp, "<b>Input Link Code is Invalid !</b>")
             return
         try:
-            msg = await client.get_messages(Var.FILE_STORE, message_ids=fid)
-            if msg.empty:
+            if not (nmsg := await delivery.send(message.chat.id, fid)):
                 return await editMessage(temp, "<b>File Not Found !</b>")
-            nmsg = await msg.copy(message.chat.id, reply_markup=None)
             await temp.delete()
             if Var.AUTO_DEL:
-                async def auto_del(msg, timer):
-                    await asleep(timer)
-                    await msg.delete()
                 await sendMessage(message,f'<i>File will be Auto Deleted in {convertTime(Var.DEL_TIMER)}, Forward to Saved Messages Now..</i>')
-                bot_loop.create_task(auto_del(nmsg, Var.DEL_TIMER))
+                await autodel.schedule(message.chat.id, nmsg.id, Var.DEL_TIMER)
         except Exception as e:
             await rep.report(f"User : {uid} | Error : {str(e)}", "error")
             await editMessage(temp, "<b>File Not Found !</b>")
     else:
         await editMessage(temp, "<b>Input Link is Invalid for Usage !</b>")
 
+@bot.on_chat_member_updated(filters.chat([chat_id for chat_id in Var.FSUB_CHATS if chat_id]))
+async def fsub_member_updated(client, update):
+    fsub_updated(update)
+
 @bot.on_message(command('pause') & private & user(Var.ADMINS))
 async def pause_fetch(client, message):
     ani_cache['fetch_animes'] = False
@@ -99,6 +104,47 @@ async def process_direct_file(client, message):
 async def send_log(client, message):
     await message.reply_document("log.txt", quote=True)
 
+@bot.on_message(command('stats') & private & user(Var.ADMINS))
+@new_task
+async def send_stats(client, message):
+    txt = "<b>📊 Worker Pools</b>\n\n"
+    txt += f"<b>encode :</b> <code>{ffpool.active}/{ffpool.workers} busy, {ffpool.pending} queued, {round(ffpool.avg_wait, 2)}s avg wait</code>\n"
+    for name, st in executors.stats().items():
+        txt += f"<b>{name} :</b> <code>{st['inflight']}/{st['size']} inflight, {st['depth']} queued, {st['avg_wait']}s avg wait ({st['max_wait']}s max), {st['avg_run']}s avg run</code>\n"
+    await sendMessage(message, txt)
+
+@bot.on_message(command('autotune') & private & user(Var.ADMINS))
+@new_task
+async def autotune_profiles(client, message):
+    quals = [qual for qual in message.text.split()[1:] if qual in Var.QUALS] or Var.QUALS
+    stat = await sendMessage(message, f"<i>Benchmarking Encode Profiles for {', '.join(quals)}...</i>")
+    lines = []
+    async def on_result(qual, preset, crf, avg):
+        lines.append(format_result(qual, preset, crf, avg))
+        updater.update(stat, "<b>⚙️ Autotune Running...</b>\n\n" + "\n".join(lines[-25:]))
+    try:
+        _, profile = await ffpool.submit(autotune, quals, on_result)
+    except Exception as e:
+        await rep.report(f"Autotune Failed : {e}", "error")
+        return await sendMessage(message, f"<b>Autotune Failed :</b> <code>{e}</code>")
+    txt = "<b>⚙️ Recommended Profile ( Saved as <code>auto</code> )</b>\n\n"
+    for qual, ffcode in profile.items():
+        preset = m.group(1) if (m := research(r"-preset\s+(\S+)", ffcode)) else "?"
+        crf = m.group(1) if (m := research(r"-crf\s+(\S+)", ffcode)) else "?"
+        txt += f"<b>{qual}p :</b> <code>{preset}/crf{crf}</code>\n"
+    txt += "\n<i>Use /profile auto to Switch Encodes to it.</i>"
+    await sendMessage(message, txt)
+
+@bot.on_message(command('profile') & private & user(Var.ADMINS))
+@new_task
+async def set_profile(client, message):
+    args = message.text.split()
+    if len(args) <= 1:
+        return await sendMessage(message, "<b>Usage :</b> <code>/profile default|auto</code>")
+    name = await load_profile(args[1])
+    await db.setActiveProfile(name)
+    await sendMessage(message, f"<b>Encode Profile Switched to</b> <code>{name}</code>")
+
 @bot.on_message(command('addlink') & private & user(Var.ADMINS))
 @new_task
 async def add_link(client, message):
@@ -1,27 +1,25 @@
-from json import loads as jloads
 from os import path as ospath, execl
 from sys import executable
-from aiohttp import ClientSession
-from bot import Var, bot, ffQueue
-from bot.core.text_utils import TextEditor
+from bot import Var, bot
+from bot.core.func_utils import kill_ffpids
+from bot.core.text_utils import TextEditor, batch_load_anilist
 from bot.core.reporter import rep
+from bot.core.httpclient import http_client
 
 async def upcoming_animes():
     if Var.SEND_SCHEDULE:
         try:
-            async with ClientSession() as ses:
-                res = await ses.get("https://subsplease.org/api/?f=schedule&h=true&tz=Asia/Kolkata")
-                aniContent = jloads(await res.text())["schedule"]
+            _, res, _ = await http_client.get("https://subsplease.org/api/?f=schedule&h=true&tz=Asia/Kolkata")
+            aniContent = res["schedule"]
             text = "<b>📆 Today's Anime Releases Schedule [IST]</b>\n\n"
-            for i in aniContent:
-                aname = TextEditor(i["title"])
-                await aname.load_anilist()
+            anames = await batch_load_anilist([TextEditor(i["title"]) for i in aniContent])
+            for i, aname in zip(aniContent, anames):
                 text += f''' <a href="https://subsplease.org/shows/{i['page']}">{aname.adata.get('title', {}).get('english') or i['title']}</a>\n    • <b>Time</b> : {i["time"]} hrs\n\n'''
             TD_SCHR = await bot.send_message(Var.MAIN_CHANNEL, text)
             await (await TD_SCHR.pin()).delete()
         except Exception as err:
             await rep.report(str(err), "error")
-    if not ffQueue.empty():
-        await ffQueue.join()
     await rep.report("Auto Restarting..!!", "info")
+    await rep.flush()
+    kill_ffpids()
     execl(executable, executable, "-m", "bot")